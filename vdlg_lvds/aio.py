@@ -0,0 +1,154 @@
+#! /usr/bin/env python3
+# SPDX-License-Identifier: GPL-2.0
+#
+# asyncio front-end of LvdsSerial: one event loop can drive every bridge without a thread per camera.
+#
+
+import asyncio
+import os
+import weakref
+from contextlib import asynccontextmanager
+from time import monotonic, time_ns
+from vdlg_lvds.serial import open_serial, LvdsTtySerial
+
+POLL_S = 0.002
+
+# event loop -> {device realpath -> asyncio.Lock}
+_locks = weakref.WeakKeyDictionary()
+
+def device_lock(dev_path):
+    """ asyncio lock shared by every AsyncLvdsSerial on the same device in the running loop. """
+    locks = _locks.setdefault(asyncio.get_event_loop(), {})
+    key = os.path.realpath(dev_path)
+    if key not in locks:
+        locks[key] = asyncio.Lock()
+    return locks[key]
+
+class AsyncLvdsSerial():
+    def __init__(self, dev_path, start_wait_ms=100, stop_wait_ms=120, baud=9600, serial=None):
+        # the ioctls themselves never block, only the waiting between them is made awaitable
+        self.serial = serial if serial is not None else open_serial(dev_path, start_wait_ms=start_wait_ms, stop_wait_ms=stop_wait_ms, baud=baud)
+        self.dev = dev_path
+
+    @property
+    def lock(self):
+        return device_lock(self.dev)
+
+    @asynccontextmanager
+    async def _locked(self):
+        # the per-loop asyncio lock orders coroutines, LvdsSerial.lock keeps threads using the same
+        # serial object out; it is taken without blocking the loop
+        async with self.lock:
+            while not self.serial.lock.acquire(blocking=False):
+                await asyncio.sleep(POLL_S)
+            try:
+                yield
+            finally:
+                self.serial.lock.release()
+
+    async def _rx_wait(self, timeout):
+        # until RX data may have arrived: readability of the TTY node, else one poll interval
+        if not isinstance(self.serial, LvdsTtySerial) or self.serial.rx_ring is not None:
+            await asyncio.sleep(min(POLL_S, max(timeout, 0)))
+            return
+        loop = asyncio.get_running_loop()
+        ready = loop.create_future()
+        fd = self.serial.open().fd
+        loop.add_reader(fd, lambda: ready.done() or ready.set_result(None))
+        try:
+            await asyncio.wait_for(ready, max(timeout, 0))
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            loop.remove_reader(fd)
+
+    def close(self):
+        self.serial.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.close()
+
+    async def send(self, data: bytes):
+        async with self._locked():
+            self.serial.send(data)
+
+    async def recv(self, count:int=0):
+        async with self._locked():
+            return self.serial.recv(count)
+
+    async def wait_for_rx_stable(self, start_wait_ms, stop_wait_ms):
+        start = monotonic()
+        while self.serial.get_rx_count() == 0:
+            if monotonic() - start > start_wait_ms/1000:
+                return False
+            await self._rx_wait(start + start_wait_ms/1000 - monotonic())
+        self.serial._rx_seen()
+        byte_count = self.serial.get_rx_count()
+        start = monotonic()
+        while monotonic() - start < stop_wait_ms/1000:
+            await self._rx_wait(start + stop_wait_ms/1000 - monotonic())
+            cnt = self.serial.get_rx_count()
+            if cnt != byte_count:
+                self.serial._rx_seen()
+                byte_count = cnt
+                start = monotonic()
+        return True
+
+    async def wait_for_reply(self, frame, start_wait_ms, stop_wait_ms):
+        buf = bytearray()
+        start = monotonic()
+        limit = start_wait_ms/1000
+        while True:
+            cnt = self.serial.get_rx_count()
+            if cnt:
+                self.serial._rx_seen()
+                buf += self.serial.recv(cnt)
+                if frame(buf):
+                    break
+                start = monotonic()
+                limit = stop_wait_ms/1000
+            elif monotonic() - start > limit:
+                break
+            await self._rx_wait(start + limit - monotonic())
+        return bytes(buf)
+
+    async def _transceive(self, data, count, start_wait_ms, stop_wait_ms, frame, learned):
+        ser = self.serial
+        ser.recv()
+        ser.send(data)
+        ser._t_tx = time_ns()
+        ser._t_first = ser._t_last = None
+        ser._gap = 0
+        if frame is None:
+            await self.wait_for_rx_stable(start_wait_ms, stop_wait_ms)
+            reply = ser.recv(count)
+        else:
+            reply = await self.wait_for_reply(frame, start_wait_ms, stop_wait_ms)
+        ser._learn(data, learned, frame is None or frame(reply))
+        if count:
+            reply = reply[:count]
+        return reply
+
+    async def transceive(self, data: bytes, count:int=0, start_wait_ms=None, stop_wait_ms=None, frame=None, timeout=None):
+        """
+        Awaitable LvdsSerial.transceive(). `timeout` (seconds) bounds the whole transaction and raises
+        asyncio.TimeoutError. On timeout or cancellation the RX FIFO is flushed before the device lock is
+        released, so the next transaction never sees the tail of an abandoned reply. Waits learned by
+        the serial's AdaptiveTiming are used like in the blocking path.
+        """
+        learned = None
+        if self.serial.timing is not None and (start_wait_ms is None or stop_wait_ms is None):
+            learned = self.serial.timing.waits(self.serial.dev, data, self.serial.baud)
+        if start_wait_ms is None:
+            start_wait_ms = learned[0] if learned else self.serial.bwms
+        if stop_wait_ms is None:
+            stop_wait_ms = learned[1] if learned else self.serial.ewms
+        async with self._locked():
+            try:
+                return await asyncio.wait_for(self._transceive(data, count, start_wait_ms, stop_wait_ms, frame, learned), timeout)
+            except (asyncio.CancelledError, asyncio.TimeoutError):
+                self.serial.recv()
+                raise
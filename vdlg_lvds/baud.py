@@ -0,0 +1,118 @@
+#! /usr/bin/env python3
+# SPDX-License-Identifier: GPL-2.0
+#
+# UART baud negotiation between the bridge and the camera: step the camera to a faster rate with
+# its own command, retune the bridge, verify with an inquiry and fall back when the link breaks.
+# The rate that worked is cached per device, so the next session starts at it directly.
+#
+
+import os
+import threading
+from time import sleep
+from vdlg_lvds.store import cache_path, load_json, save_json
+from vdlg_lvds.visca import ViscaFrame, parse_replies, COMPLETION
+
+RATES = (115200, 57600, 38400, 19200, 9600)
+
+_cache_lock = threading.Lock()      # provision_all negotiates every camera in its own thread
+
+def verify_visca(serial):
+    """ True if the camera answers the version inquiry at the current bridge rate. """
+    reply = serial.transceive(bytes.fromhex("81090002FF"), frame=ViscaFrame())
+    return any(r.kind == COMPLETION for r in parse_replies(reply))
+
+def baud_key(dev, model=None):
+    """ Cache key of a camera: the real path of its bridge, plus the camera model once it is known. """
+    key = os.path.realpath(dev)
+    return f"{key}:{model}" if model else key
+
+class BaudNegotiator():
+    """
+    `serial` needs set_baud/recv/baud, `verify(serial)` says whether the camera answers at the
+    current bridge rate. `key` names the camera in the cache file (see baud_key(), None: no caching).
+    """
+    def __init__(self, serial, verify=verify_visca, key=None, path=None, settle_ms=50, attempts=2):
+        self.serial = serial
+        self.verify = verify
+        self.key = key
+        self.path = path or cache_path("baud.json")
+        self.settle_ms = settle_ms
+        self.attempts = attempts
+
+    def retune(self, rate):
+        # bridge only; drop whatever arrived garbled while the two ends disagreed
+        self.serial.set_baud(rate)
+        sleep(self.settle_ms / 1000)
+        self.serial.recv()
+
+    def check(self):
+        for _ in range(self.attempts):
+            try:
+                if self.verify(self.serial):
+                    return True
+            except (OSError, ValueError, TimeoutError):
+                pass
+        return False
+
+    def find(self, rates=RATES):
+        """ Scan the bridge through `rates` until the camera answers. Returns that rate or None. """
+        for rate in rates:
+            self.retune(rate)
+            if self.check():
+                return rate
+        return None
+
+    def cached(self):
+        """ Rates cached for the camera. A key without a model matches every camera seen on that bridge. """
+        if not self.key:
+            return []
+        rates = load_json(self.path, {})
+        return [rate for key, rate in sorted(rates.items()) if key == self.key or key.startswith(self.key + ":")]
+
+    def save(self, rate):
+        if self.key:
+            with _cache_lock:
+                rates = load_json(self.path, {})
+                rates[self.key] = rate
+                save_json(self.path, rates)
+
+    def resume(self, default=9600, rates=RATES):
+        """ Bring the bridge to the rate the camera is at: cached rate first, then `default`, then a scan. """
+        tried = []
+        for rate in (*self.cached(), default):
+            if rate and rate not in tried:
+                tried.append(rate)
+                self.retune(rate)
+                if self.check():
+                    return rate
+        rate = self.find([r for r in rates if r not in tried])
+        if rate is None:
+            raise RuntimeError("Camera does not answer at any baud rate")
+        self.save(rate)
+        return rate
+
+    def negotiate(self, switch, rates=RATES):
+        """
+        Step to the fastest of `rates` that verifies. `switch(rate)` sends the camera's own baud
+        change command at the current rate. After a failed step the camera is looked for at the old
+        rate, then at every rate, before the next slower one is tried. Returns the rate in use.
+        """
+        current = self.serial.baud
+        for rate in sorted(rates, reverse=True):
+            if rate <= current:
+                break
+            switch(rate)
+            sleep(self.settle_ms / 1000)        # let the command leave the wire at the old rate
+            self.retune(rate)
+            if self.check():
+                current = rate
+                break
+            self.retune(current)
+            if not self.check():
+                current = self.find(sorted(set(rates) | {current}, reverse=True))
+                if current is None:
+                    raise RuntimeError(f"Camera lost after switching to {rate} baud")
+                if current >= rate:
+                    break
+        self.save(current)
+        return current
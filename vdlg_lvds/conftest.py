@@ -0,0 +1,65 @@
+import os
+import pytest
+from . import ioctl as ioctl_mod
+from .ioctl import *
+
+class FakeBridge:
+    """ Emulates the ioctl side of the crosslink driver on top of /dev/null. """
+    def __init__(self):
+        self.rx = bytearray()
+        self.tx = bytearray()
+        self.baud = 9600
+        self.calls = 0
+        self.replies = {}       # TX bytes -> bytes that show up in RX
+        self.timing = lambda: (1920, 1080, 16667)   # measured (columns, lines, period_us)
+        self.status = 0x13
+        self.writes = []
+        self.regs = bytearray(0x80)             # writable part of the register file
+        self.regs[0x1] = 0x07
+        self.regs[0xC:0xE] = (2500).to_bytes(2, "little")
+
+    def ioctl(self, fd, cmd, buf, *args):
+        self.calls += 1
+        os.fstat(fd)    # EBADF like the real ioctl on a stale handle
+        if cmd == LVDS_CMD_SERIAL_SEND_TX:
+            self.tx += bytes(buf.data[:buf.len])
+            self.rx += self.replies.get(bytes(buf.data[:buf.len]), b"")
+        elif cmd == LVDS_CMD_SERIAL_RECV_RX:
+            n = buf.len or len(self.rx)
+            buf.data[:n] = self.rx[:n]
+            buf.len = n
+            del self.rx[:n]
+        elif cmd == LVDS_CMD_SERIAL_RX_CNT:
+            buf.len = len(self.rx)
+        elif cmd == LVDS_CMD_GET_UART_STATUS:
+            buf.len = 0x4       # TX empty
+        elif cmd in (LVDS_CMD_GET_COLM_COUNT, LVDS_CMD_GET_LINE_COUNT, LVDS_CMD_GET_FRAME_PERIOD):
+            buf.len = self.timing()[(LVDS_CMD_GET_COLM_COUNT, LVDS_CMD_GET_LINE_COUNT, LVDS_CMD_GET_FRAME_PERIOD).index(cmd)]
+        elif cmd == LVDS_CMD_GET_REGS:
+            cols, lines, period = self.timing()
+            self.regs[0x4:0x8] = lines.to_bytes(2, "little") + cols.to_bytes(2, "little")
+            self.regs[0x8] = self.status
+            self.regs[0xE:0x11] = period.to_bytes(2, "little") + bytes([148])
+            start = buf.data[0]
+            buf.data[:buf.len] = self.regs[start:start + buf.len]
+        elif cmd == LVDS_CMD_SET_REGS:
+            self.writes.append(bytes(buf.data[:buf.len]))
+            self.regs[buf.data[0]:buf.data[0] + buf.len] = bytes(buf.data[:buf.len])
+        elif cmd == LVDS_CMD_FORCE_HVSYNC_INV:
+            self.regs[0x3] = buf.len
+        elif cmd == LVDS_CMD_GET_PIXEL_FREQ:
+            buf.len = 148
+        elif cmd == LVDS_CMD_GET_LVDS_STATUS:
+            buf.len = self.status
+        elif cmd == LVDS_CMD_SERIAL_BAUD:
+            if buf.len:
+                self.baud = buf.len
+            else:
+                buf.len = self.baud
+        return 0
+
+@pytest.fixture
+def bridge(monkeypatch):
+    fake = FakeBridge()
+    monkeypatch.setattr(ioctl_mod.fcntl, "ioctl", fake.ioctl)
+    return fake
@@ -0,0 +1,228 @@
+#! /usr/bin/env python3
+# SPDX-License-Identifier: GPL-2.0
+#
+# Resident daemon owning every LVDS bridge, serializing serial transactions per device
+# for any number of clients on a Unix socket.
+#
+# Wire format, both directions: 4 byte big-endian length + UTF-8 JSON object.
+#   request:  {"op": "transceive", "dev": "/dev/links/lvds2mipi_1", "data": "81090002ff",
+#              "count": 0, "start_wait_ms": null, "stop_wait_ms": null, "frame": "visca", "baud": 9600}
+#   reply:    {"ok": true, "data": "9050..."}  or  {"ok": false, "error": "..."}
+# ops: transceive, send, recv, ping
+# VISCA inquiries (frame "visca"/"visca-ack") are answered from a per device ShadowState while fresh;
+# "max_age" (seconds) in a request overrides the freshness limit, 0 forces a camera round-trip.
+#
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import struct
+from vdlg_lvds.aio import AsyncLvdsSerial
+from vdlg_lvds.serial import open_serial, DEFAULT_SOCKET
+from vdlg_lvds.state import ShadowState
+from vdlg_lvds.tamarisk import TamariskFrame
+from vdlg_lvds.visca import ViscaFrame, ACK, COMPLETION
+
+_hdr = struct.Struct(">I")
+
+FRAMES = {
+    None:        lambda: None,
+    "visca":     lambda: ViscaFrame(COMPLETION),
+    "visca-ack": lambda: ViscaFrame(ACK),
+    "tamarisk":  TamariskFrame,
+}
+
+def frame_name(frame):
+    if frame is None:
+        return None
+    if isinstance(frame, ViscaFrame):
+        return "visca-ack" if frame.until == ACK else "visca"
+    if isinstance(frame, TamariskFrame):
+        return "tamarisk"
+    raise ValueError(f"frame detector {frame!r} can not be sent to the daemon")
+
+class LvdsDaemon():
+    def __init__(self):
+        self.devices = {}
+        self.shadows = {}
+        self.opening = {}       # realpath -> executor future of an open_serial in progress
+
+    async def device(self, dev, baud=None):
+        key = os.path.realpath(dev)
+        ser = self.devices.get(key)
+        if ser is None:
+            # baud setup and the RX flush happen once per device, not once per client, and off the
+            # event loop so other clients keep being served meanwhile
+            opening = self.opening.get(key)
+            if opening is None:
+                kwargs = {"baud": baud} if baud else {}
+                opening = self.opening[key] = asyncio.get_running_loop().run_in_executor(None, lambda: open_serial(dev, **kwargs))
+            try:
+                serial = await opening
+            finally:
+                self.opening.pop(key, None)
+            ser = self.devices.get(key)
+            if ser is None:
+                ser = self.devices[key] = AsyncLvdsSerial(dev, serial=serial)
+                self.shadows[key] = ShadowState()
+        return ser
+
+    async def handle(self, req):
+        op = req.get("op")
+        if op == "ping":
+            return {"ok": True, "devices": sorted(self.devices),
+                    "cache": {k: {"hits": v.hits, "misses": v.misses} for k, v in self.shadows.items()}}
+        ser = await self.device(req["dev"], req.get("baud"))
+        if req.get("baud") and req["baud"] != ser.serial.baud:
+            async with ser._locked():
+                ser.serial.set_baud(req["baud"])
+        shadow = self.shadows[os.path.realpath(req["dev"])]
+        if op == "transceive":
+            cmd = bytes.fromhex(req["data"])
+            visca = str(req.get("frame")).startswith("visca")
+            data = shadow.lookup(cmd, req.get("max_age")) if visca else None
+            if data is None:
+                data = await ser.transceive(cmd, req.get("count", 0), req.get("start_wait_ms"),
+                                            req.get("stop_wait_ms"), FRAMES[req.get("frame")](), req.get("timeout"))
+                if visca:
+                    shadow.observe(cmd, data)
+                else:
+                    shadow.invalidate()     # replies of other framings are not decoded, the command may change anything
+        elif op == "send":
+            shadow.invalidate()             # raw frames bypass the shadow; drop it rather than serve stale answers
+            data = await ser.send(bytes.fromhex(req["data"])) or b""
+        elif op == "recv":
+            data = await ser.recv(req.get("count", 0))
+        else:
+            raise ValueError(f"unknown op: {op}")
+        return {"ok": True, "data": data.hex()}
+
+    async def client(self, reader, writer):
+        try:
+            while True:
+                size, = _hdr.unpack(await reader.readexactly(_hdr.size))
+                req = json.loads(await reader.readexactly(size))
+                try:
+                    resp = await self.handle(req)
+                except Exception as e:
+                    resp = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+                msg = json.dumps(resp).encode()
+                writer.write(_hdr.pack(len(msg)) + msg)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, path):
+        if os.path.exists(path):
+            # a stale socket of a dead daemon is replaced, a live one is left alone
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(path)
+            except (ConnectionRefusedError, FileNotFoundError):
+                os.unlink(path)
+            else:
+                raise RuntimeError(f"A daemon is already serving {path}")
+            finally:
+                probe.close()
+        server = await asyncio.start_unix_server(self.client, path)
+        os.chmod(path, 0o660)
+        return server
+
+    async def serve(self, path):
+        server = await self.start(path)
+        async with server:
+            await server.serve_forever()
+
+class DaemonClient():
+    """ Blocking client of the daemon. One connection, reused for every request. """
+    def __init__(self, path=DEFAULT_SOCKET):
+        self.path = path
+        self.sock = None
+
+    def connect(self):
+        if self.sock is None:
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.connect(self.path)
+        return self
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+    def _recv_exact(self, size):
+        buf = bytearray()
+        while len(buf) < size:
+            chunk = self.sock.recv(size - len(buf))
+            if not chunk:
+                raise ConnectionError("daemon closed the connection")
+            buf += chunk
+        return bytes(buf)
+
+    def request(self, **req):
+        msg = json.dumps(req).encode()
+        self.connect().sock.sendall(_hdr.pack(len(msg)) + msg)
+        size, = _hdr.unpack(self._recv_exact(_hdr.size))
+        resp = json.loads(self._recv_exact(size))
+        if not resp.get("ok"):
+            raise RuntimeError(resp.get("error"))
+        return resp
+
+class RemoteSerial():
+    """ Drop-in for LvdsSerial transceive/send/recv, executed by the daemon. """
+    def __init__(self, dev_path, client=None, start_wait_ms=None, stop_wait_ms=None, baud=None):
+        self.dev = dev_path
+        self.client = client if client is not None else DaemonClient()
+        self.bwms = start_wait_ms
+        self.ewms = stop_wait_ms
+        self.baud = baud
+
+    def close(self):
+        self.client.close()
+
+    def set_baud(self, baud:int):
+        # applied by the daemon with the next request
+        self.baud = baud
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _request(self, op, **req):
+        return self.client.request(op=op, dev=self.dev, baud=self.baud, **req)
+
+    def send(self, data: bytes):
+        self._request("send", data=bytes(data).hex())
+
+    def recv(self, count:int=0):
+        return bytes.fromhex(self._request("recv", count=count)["data"])
+
+    def transceive(self, data: bytes, count:int=0, start_wait_ms=None, stop_wait_ms=None, frame=None):
+        resp = self._request("transceive", data=bytes(data).hex(), count=count, frame=frame_name(frame),
+                             start_wait_ms=self.bwms if start_wait_ms is None else start_wait_ms,
+                             stop_wait_ms=self.ewms if stop_wait_ms is None else stop_wait_ms)
+        return bytes.fromhex(resp["data"])
+
+def connect_serial(dev_path, socket_path=None, **kwargs):
+    """ RemoteSerial through the daemon when a socket is given, else direct device access. """
+    if socket_path:
+        return RemoteSerial(dev_path, DaemonClient(socket_path), **kwargs)
+    return open_serial(dev_path, **kwargs)
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve LVDS bridge serial access to many clients over a Unix socket")
+    parser.add_argument("-s", "--socket", type=str, default=DEFAULT_SOCKET, help="Unix socket path")
+    args = parser.parse_args()
+    try:
+        asyncio.run(LvdsDaemon().serve(args.socket))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
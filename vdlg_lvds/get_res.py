@@ -1,27 +1,96 @@
 import argparse
-from time import sleep
+import errno
+import re
+from time import sleep, monotonic
 from vdlg_lvds.ioctl import *
-import fcntl
 import glob
+import sys
+from vdlg_lvds.regmap import RegisterMap, REG_END
+from vdlg_lvds.telemetry import TelemetrySampler, watch, TIMING_START
+
+# video height -> width of the supported LVDS modes
+WIDTHS = {720: 1280, 1080: 1920}
+
+def parse_resolution(resolution):
+    """ '1080p60' -> (1920, 1080, 60.0) """
+    m = re.fullmatch(r"(\d+)p(\d+(?:\.\d+)?)", resolution)
+    if m is None or int(m.group(1)) not in WIDTHS:
+        raise ValueError(f"Unsupported resolution: {resolution}")
+    height = int(m.group(1))
+    return WIDTHS[height], height, float(m.group(2))
+
+def read_timing(dev):
+    """ (columns, lines, frame period in us) as measured by the FPGA. `dev` is a path or an open LvdsDevice. """
+    if isinstance(dev, LvdsDevice):
+        regs = RegisterMap(dev)
+        regs.read(TIMING_START, REG_END - TIMING_START)     # one bulk transfer for all three
+        return regs["colm_count"], regs["line_count"], regs["frame_period"]
+    with LvdsDevice(dev) as d:
+        return read_timing(d)
+
+def timing_matches(timing, resolution, tolerance=0.02):
+    """ True if measured (columns, lines, period_us) is the geometry and frame rate of `resolution`. """
+    width, height, fps = parse_resolution(resolution)
+    hres, vres, period = timing
+    return hres == width and vres == height and period > 0 and abs(period - 1e6 / fps) <= tolerance * 1e6 / fps
+
+def wait_for_lock(dev, resolution, timeout=10.0, interval=0.005, stable=0.1, tolerance=0.02):
+    """
+    Sample the FPGA counters every `interval` s until they have read the geometry and frame period
+    of `resolution` for `stable` s without a break. Returns the seconds from the call to the first
+    sample of that stable window, or None if the video did not lock within `timeout`. Raises OSError
+    if `dev` cannot be opened or its driver has no timing counters.
+    """
+    if not isinstance(dev, LvdsDevice):
+        with LvdsDevice(dev) as d:
+            return wait_for_lock(d, resolution, timeout, interval, stable, tolerance)
+    start = monotonic()
+    locked = None
+    while True:
+        now = monotonic()
+        try:
+            ok = timing_matches(read_timing(dev), resolution, tolerance)
+        except OSError as e:
+            if e.errno == errno.ENOTTY:
+                raise
+            ok = False      # counters unreadable while the link retrains
+        if not ok:
+            locked = None
+        elif locked is None:
+            locked = now
+        elif now - locked >= stable:
+            return locked - start
+        if now - start > timeout:
+            return None
+        sleep(interval)
 
 def get_resolution(dev):
-    ioctl_serial = LvdsIoctlSerial()
-    with open(dev) as f:
-        fcntl.ioctl(f, LVDS_CMD_GET_LINE_COUNT, ioctl_serial)
-        vres = ioctl_serial.len
-        fcntl.ioctl(f, LVDS_CMD_GET_COLM_COUNT, ioctl_serial)
-        hres = ioctl_serial.len
-        fcntl.ioctl(f, LVDS_CMD_GET_FRAME_PERIOD, ioctl_serial)
-        frame_rate = 1000000.0 / ioctl_serial.len
-        print(f"{hres} x {vres} @ {frame_rate:.1f}")
+    hres, vres, period = read_timing(dev)
+    frame_rate = 1000000.0 / period
+    print(f"{hres} x {vres} @ {frame_rate:.1f}")
 
 def main():
     parser = argparse.ArgumentParser(description="Get current LVDS camera resolution")
     lvds_devs = glob.glob("/dev/links/lvds*")
     default_lvds = lvds_devs[0] if lvds_devs else "/dev/v4l-subdev1"
     parser.add_argument("-d", "--dev", type=str, default=default_lvds, help="Device path")
+    parser.add_argument("-w", "--watch", action="store_true", help="Sample timing and status continuously, print JSON lines on changes")
+    parser.add_argument("-a", "--all", action="store_true", help="All /dev/links/lvds* bridges")
+    parser.add_argument("-r", "--rate", type=float, default=50, help="Watch sample rate in Hz")
+    parser.add_argument("-i", "--interval", type=float, default=5, help="Watch statistics interval in s")
     args = parser.parse_args()
-    get_resolution(args.dev)
+    devs = sorted(lvds_devs) if args.all else [args.dev]
+    if args.watch:
+        with TelemetrySampler(devs, rate_hz=args.rate) as sampler:
+            try:
+                watch(sampler, sys.stdout, interval=args.interval)
+            except KeyboardInterrupt:
+                pass
+        return
+    for dev in devs:
+        if args.all:
+            print(f"{dev}: ", end="")
+        get_resolution(dev)
 
 if __name__ == "__main__":
     main()
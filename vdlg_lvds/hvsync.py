@@ -0,0 +1,97 @@
+#! /usr/bin/env python3
+# SPDX-License-Identifier: GPL-2.0
+#
+# HV-sync polarity bring-up: try the LVDS_INV settings until the FPGA counters measure a stable,
+# plausible video geometry, keep the one that works and cache it per camera model, so later boots
+# apply it directly without probing.
+#
+
+import argparse
+import glob
+from time import monotonic, sleep
+from vdlg_lvds.ioctl import *
+from vdlg_lvds.get_res import WIDTHS, read_timing
+from vdlg_lvds.store import cache_path, load_json, save_json
+
+# CROSSLINK_REG_LVDS_INV: 0 = FPGA detects the polarity, [0]=force-non-invert, [1]=force-invert
+HVSYNC_AUTO = 0
+HVSYNC_NORMAL = 1
+HVSYNC_INVERT = 2
+HVSYNC_SETTINGS = (HVSYNC_AUTO, HVSYNC_NORMAL, HVSYNC_INVERT)
+
+PERIOD_US = (14000, 42000)      # 24..71 fps
+
+def plausible(timing):
+    cols, lines, period = timing
+    return WIDTHS.get(lines) == cols and PERIOD_US[0] <= period <= PERIOD_US[1]
+
+def wait_stable(dev, stable=0.2, timeout=1.5, interval=0.005):
+    """ The (cols, lines, period_us) that stays plausible and unchanged for `stable` s, None on timeout. """
+    start = monotonic()
+    first = None
+    since = None
+    while monotonic() - start <= timeout:
+        try:
+            timing = read_timing(dev)
+        except OSError:
+            timing = None
+        now = monotonic()
+        if timing is None or not plausible(timing):
+            first = since = None
+        elif first is None or timing[:2] != first[:2] or abs(timing[2] - first[2]) > first[2] * 0.02:
+            first, since = timing, now
+        elif now - since >= stable:
+            return first
+        sleep(interval)
+    return None
+
+def camera_model(serial):
+    """ 'VVVV:MMMM' vendor and model ID of the camera from its VISCA version reply, None if it does not answer. """
+    from vdlg_lvds.profiles import parse_version
+    from vdlg_lvds.visca import ViscaFrame
+    ids = parse_version(serial.transceive(bytes.fromhex("81090002FF"), frame=ViscaFrame()))
+    return f"{ids[0]:04X}:{ids[1]:04X}" if ids else None
+
+def detect_polarity(dev, model=None, path=None, probe=False, settle_s=0.1, stable=0.2, timeout=1.5):
+    """
+    Set the HV-sync polarity of `dev` (path or LvdsDevice). A setting cached for `model` is applied
+    without probing unless `probe`, otherwise each of HVSYNC_SETTINGS is tried and the first one giving stable
+    video is kept and cached. Returns the setting; raises RuntimeError if none works.
+    """
+    if not isinstance(dev, LvdsDevice):
+        with LvdsDevice(dev) as d:
+            return detect_polarity(d, model, path, probe, settle_s, stable, timeout)
+    path = path or cache_path("hvsync.json")
+    cached = load_json(path, {}).get(model) if model and not probe else None
+    if cached is not None:
+        dev.write_u32(LVDS_CMD_FORCE_HVSYNC_INV, cached)
+        return cached
+    for setting in HVSYNC_SETTINGS:
+        dev.write_u32(LVDS_CMD_FORCE_HVSYNC_INV, setting)
+        sleep(settle_s)
+        timing = wait_stable(dev, stable, timeout)
+        if timing:
+            print(f"hv-sync setting {setting}: {timing[0]} x {timing[1]} @ {1e6 / timing[2]:.1f}")
+            if model:
+                settings = load_json(path, {})
+                settings[model] = setting
+                save_json(path, settings)
+            return setting
+    dev.write_u32(LVDS_CMD_FORCE_HVSYNC_INV, HVSYNC_AUTO)
+    raise RuntimeError("No HV-sync polarity gives stable video")
+
+def main():
+    from vdlg_lvds.serial import open_serial
+    lvds_devs = glob.glob("/dev/links/lvds*")
+    default_lvds = lvds_devs[0] if lvds_devs else "/dev/v4l-subdev1"
+    parser = argparse.ArgumentParser(description="Find and apply the HV-sync polarity of an LVDS camera")
+    parser.add_argument("-d", "--dev", type=str, default=default_lvds, help="Device path")
+    parser.add_argument("-p", "--probe", action="store_true", help="Probe even if a setting is cached for this camera model")
+    args = parser.parse_args()
+
+    with open_serial(args.dev) as ser:
+        model = camera_model(ser)
+    print(f"camera {model}: hv-sync setting {detect_polarity(args.dev, model, probe=args.probe)}")
+
+if __name__ == "__main__":
+    main()
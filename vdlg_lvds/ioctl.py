@@ -5,6 +5,9 @@
 #
 
 import ctypes
+import errno
+import fcntl
+import os
 
 # Define the IOCTL commands
 LVDS_CMD_SERIAL_SEND_TX     = 0x7601
@@ -24,6 +27,9 @@ LVDS_CMD_GET_REGS			= 0x760E
 LVDS_CMD_SET_REGS			= 0x760F
 LVDS_CMD_SERIAL_RX_LAST	    = 0x7610
 
+# depth of the FPGA UART RX/TX fifos
+UART_FIFO_SIZE              = 32
+
 # Define the struct
 class LvdsIoctlSerial(ctypes.Structure):
     _fields_ = [
@@ -31,3 +37,60 @@ class LvdsIoctlSerial(ctypes.Structure):
         ("data", ctypes.c_uint8 * 64),
     ]
 
+
+# errors after which the device node is worth re-opening (driver reloaded, udev re-created the link)
+REOPEN_ERRNOS = (errno.EBADF, errno.ENODEV, errno.ENXIO, errno.ENOENT)
+
+class LvdsDevice():
+    """ Long-lived handle on a LVDS2MIPI sub-device. Re-opens the node if it goes away. """
+    def __init__(self, dev_path):
+        self.dev = dev_path
+        self.fd = None
+        self._io = LvdsIoctlSerial()
+        self.open()
+
+    def open(self):
+        if self.fd is None:
+            self.fd = os.open(self.dev, os.O_RDONLY | os.O_CLOEXEC)
+        return self
+
+    def close(self):
+        if self.fd is not None:
+            fd, self.fd = self.fd, None
+            os.close(fd)
+
+    def reopen(self):
+        try:
+            self.close()
+        except OSError:
+            pass
+        return self.open()
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+    def ioctl(self, cmd, buf):
+        try:
+            return fcntl.ioctl(self.open().fd, cmd, buf)
+        except OSError as e:
+            if e.errno not in REOPEN_ERRNOS:
+                raise
+        return fcntl.ioctl(self.reopen().fd, cmd, buf)
+
+    def read_u32(self, cmd):
+        self._io.len = 0        # 16 bit registers are raw-read into the low half only
+        self.ioctl(cmd, self._io)
+        return self._io.len
+
+    def write_u32(self, cmd, value):
+        self._io.len = value
+        self.ioctl(cmd, self._io)
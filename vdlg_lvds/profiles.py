@@ -0,0 +1,167 @@
+#! /usr/bin/env python3
+# SPDX-License-Identifier: GPL-2.0
+#
+# Camera profile database: per zoomblock family the VISCA mode sequences and the apply steps that
+# make them take effect. Built-in profiles cover the supported cameras, JSON files in PROFILE_DIR
+# add models or override a built-in of the same name without touching code.
+#
+# Profile file (one profile or a list of them):
+#   {"name": "sony_ev75xx", "vendor": "0020", "models": ["06", "0640"],
+#    "apply": ["8101041903FF"],
+#    "modes": {"720p60": ["8101042472000AFF", {"cmd": "81010424740000FF", "wait_ms": 20}]},
+#    "bauds": {"38400": "..."}}
+# A model of two hex digits matches the whole HH-- series, four digits one exact model ID.
+#
+
+from collections import namedtuple
+from glob import glob
+import os
+import threading
+from vdlg_lvds.store import load_json
+from vdlg_lvds.visca import parse_replies, COMPLETION
+
+PROFILE_DIR = os.environ.get("VDLG_LVDS_PROFILES", "/etc/vdlg_lvds/profiles")
+
+# cmd: VISCA bytes, apply: runs after all setters completed, wait_ms: settle time after it (None = none)
+Step = namedtuple("Step", "cmd apply wait_ms")
+# bauds: rate -> command that switches the camera UART to it, live (for baud.BaudNegotiator)
+Profile = namedtuple("Profile", "name vendor models modes bauds")
+
+BUILTIN = [
+    {   # Y0 50 00 20 HH HH JJ JJ KK FF, HH HH = 0640: FCB-EV7520A (to be tested)
+        "name": "sony_ev75xx", "vendor": "0020", "models": ["06"],
+        "apply": ["8101041903FF"],
+        "modes": {
+            "720p25": ["81010424720101FF", "81010424740000FF"],
+            "720p30": ["8101042472000FFF", "81010424740000FF"],
+            "720p50": ["8101042472000CFF", "81010424740000FF"],
+            "720p60": ["8101042472000AFF", "81010424740000FF"],
+            "1080p25": ["81010424720008FF", "81010424740000FF"],
+            "1080p30": ["81010424720007FF", "81010424740000FF"],
+            "1080p50": ["81010424720104FF", "81010424740001FF"],
+            "1080p60": ["81010424720105FF", "81010424740001FF"],
+        },
+    },
+    {   # HH HH = 070E: FCB-EV9500L (tested), 0711: FCB-EV9520L (tested)
+        "name": "sony_ev95xx", "vendor": "0020", "models": ["07"],
+        "apply": ["8101041903FF"],
+        "modes": {
+            "720p25": ["81010424720101FF", "81010424740000FF"],
+            "720p30": ["8101042472000FFF", "81010424740000FF"],
+            "720p50": ["8101042472000CFF", "81010424740000FF"],
+            "720p60": ["8101042472000AFF", "81010424740000FF"],
+            "1080p25": ["81010424720008FF", "81010424740000FF"],
+            "1080p30": ["81010424720007FF", "81010424740000FF"],
+            "1080p50": ["81010424720104FF", "81010424740001FF"],
+            "1080p60": ["81010424720105FF", "81010424740001FF"],
+        },
+    },
+    {   # Y0 50 00 20 mn pq rs tu vw FF, mn pq = 0466: 24Z2.1-10X/20X/30X/40X/55X, 25Z2.4-36X (tested)
+        "name": "videology", "vendor": "0020", "models": ["04"],
+        "apply": [],
+        "modes": {
+            "720p25": ["81010424720101FF", "81010424740000FF"],
+            "720p30": ["8101042472000EFF", "81010424740000FF"],
+            "720p50": ["8101042472000CFF", "81010424740000FF"],
+            "720p60": ["81010424720009FF", "81010424740000FF"],
+            "1080p25": ["81010424720008FF", "81010424740000FF"],
+            "1080p30": ["81010424720006FF", "81010424740000FF"],
+            "1080p50": ["81010424720104FF", "81010424740001FF"],
+            "1080p60": ["81010424720103FF", "81010424740001FF"],
+        },
+    },
+    {   # Y0 50 00 23 HH HH JJ JJ KK FF, HH HH = F011: MP1010-VC, F017: MP3010M-EV (tested)
+        "name": "tamron", "vendor": "0023", "models": ["F0"],
+        "apply": ["8101041903FF"],
+        "modes": {
+            "720p25": ["81010424720101FF", "81010424740000FF"],
+            "720p30": ["8101042472000FFF", "81010424740000FF"],
+            "720p50": ["81010424720006FF", "81010424740000FF"],
+            "720p60": ["81010424720005FF", "81010424740000FF"],
+            "1080p25": ["81010424720002FF", "81010424740000FF"],
+            "1080p30": ["81010424720001FF", "81010424740000FF"],
+            "1080p50": ["81010424720008FF", "81010424740001FF"],
+            "1080p60": ["81010424720007FF", "81010424740001FF"],
+        },
+    },
+]
+
+def parse_step(entry, apply=False):
+    # "8101...FF" or {"cmd": "8101...FF", "wait_ms": n}
+    if isinstance(entry, str):
+        entry = {"cmd": entry}
+    return Step(bytes.fromhex(entry["cmd"]), apply, entry.get("wait_ms"))
+
+def parse_profile(spec):
+    """ Profile from its JSON form, command hex parsed to bytes once here. Raises ValueError/KeyError on bad specs. """
+    apply = [parse_step(e, apply=True) for e in spec.get("apply", [])]
+    modes = {res: [parse_step(e) for e in steps] + apply for res, steps in spec["modes"].items()}
+    models = [m.upper() for m in spec["models"]]
+    for m in models:
+        if len(m) not in (2, 4):
+            raise ValueError(f"{spec['name']}: model must be HH or HHHH, not {m}")
+    bauds = {int(rate): bytes.fromhex(cmd) for rate, cmd in spec.get("bauds", {}).items()}
+    return Profile(spec["name"].lower(), int(spec["vendor"], 16), models, modes, bauds)     # get() is case-insensitive
+
+def parse_version(data):
+    """ (vendor, model) from a version inquiry reply or its 7-byte payload, as bytes or hex. None if it is neither. """
+    if isinstance(data, str):
+        data = bytes.fromhex(data)
+    if len(data) != 7:
+        answer = next((r for r in parse_replies(data) if r.kind == COMPLETION), None)
+        if answer is None or len(answer.payload) != 7:
+            return None
+        data = answer.payload
+    return int.from_bytes(data[0:2], "big"), int.from_bytes(data[2:4], "big")
+
+class ProfileDB():
+    """ Profiles indexed by (vendor, model ID) and (vendor, model series) for a single-lookup detection. """
+    def __init__(self, specs=BUILTIN, profile_dir=None):
+        self.profiles = {}
+        self.by_model = {}
+        self.by_series = {}
+        for spec in specs:
+            self.add(parse_profile(spec))
+        for path in sorted(glob(os.path.join(profile_dir, "*.json"))) if profile_dir else []:
+            self.load(path)
+
+    def load(self, path):
+        specs = load_json(path)
+        if specs is None:
+            raise ValueError(f"Cannot read profile file {path}")
+        for spec in specs if isinstance(specs, list) else [specs]:
+            self.add(parse_profile(spec))
+
+    def add(self, profile):
+        old = self.profiles.pop(profile.name, None)
+        if old is not None:     # a file overrides the built-in of the same name
+            self.by_model = {k: p for k, p in self.by_model.items() if p is not old}
+            self.by_series = {k: p for k, p in self.by_series.items() if p is not old}
+        self.profiles[profile.name] = profile
+        for m in profile.models:
+            if len(m) == 4:
+                self.by_model[profile.vendor, int(m, 16)] = profile
+            else:
+                self.by_series[profile.vendor, int(m, 16)] = profile
+
+    def get(self, name):
+        return self.profiles.get(name.lower())
+
+    def lookup(self, version):
+        """ Profile for a version reply/payload, exact model ID first, then its series. """
+        ids = parse_version(version)
+        if ids is None:
+            return None
+        vendor, model = ids
+        return self.by_model.get((vendor, model)) or self.by_series.get((vendor, model >> 8))
+
+_default = None
+_default_lock = threading.Lock()
+
+def default_db():
+    """ Built-ins plus PROFILE_DIR, loaded once on first use (provision_all calls this from many threads). """
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = ProfileDB(profile_dir=PROFILE_DIR)
+    return _default
@@ -0,0 +1,153 @@
+#! /usr/bin/env python3
+# SPDX-License-Identifier: GPL-2.0
+#
+# FPGA register file of the LVDS2MIPI bridge (enum crosslink_regs in crosslink.h), accessed in bulk
+# through LVDS_CMD_GET_REGS / LVDS_CMD_SET_REGS with a cached image for diff writes.
+#
+# Both ioctls take the start address in data[0] and transfer `len` bytes of data[] (64 max).
+# For SET_REGS this means the first byte written is the address itself, so a write of the
+# registers from `a` on is issued from `a - 1` and must be preceded by a read-only register;
+# ID (0x1) and UART_RX_LAST (0xB) sit right before the two writable groups.
+#
+
+from collections import namedtuple
+from vdlg_lvds.ioctl import *
+
+BULK_MAX = 64
+SERIAL_BASE = 0x80      # reads/writes from here on go to the UART fifos, never touched by bulk access
+
+Register = namedtuple("Register", "address size writable")
+
+REGISTERS = {
+    "id":           Register(0x01, 1, False),
+    "enable":       Register(0x02, 1, True),    # [b3]=CAM-POW-EN [b2]=UART-EN [b1]=LVDS-EN [b0]=MIPI-EN
+    "lvds_inv":     Register(0x03, 1, True),    # [1]=force-invert [0]=force-non-invert
+    "line_count":   Register(0x04, 2, False),
+    "colm_count":   Register(0x06, 2, False),
+    "lvds_status":  Register(0x08, 1, False),
+    "uart_stat":    Register(0x09, 1, False),
+    "uart_rx_cnt":  Register(0x0A, 1, False),
+    "uart_rx_last": Register(0x0B, 1, False),
+    "uart_prescl":  Register(0x0C, 2, True),
+    "frame_period": Register(0x0E, 2, False),
+    "px_mhz":       Register(0x10, 1, False),
+}
+
+REG_BASE = min(r.address for r in REGISTERS.values())
+REG_END = max(r.address + r.size for r in REGISTERS.values())
+
+def _writable(address):
+    return any(r.writable and r.address <= address < r.address + r.size for r in REGISTERS.values())
+
+class RegisterMap():
+    """
+    Cached image of the register file of one bridge. `dev` is a path or an open LvdsDevice.
+    Values are little-endian like the regmap of the driver.
+    """
+    def __init__(self, dev):
+        self.dev = dev if isinstance(dev, LvdsDevice) else LvdsDevice(dev)
+        self.image = bytearray(REG_END)
+        self.loaded = set()     # addresses the image holds read or written values for
+        self.ioctls = 0
+        self._io = LvdsIoctlSerial()
+
+    def close(self):
+        self.dev.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def read(self, start=REG_BASE, count=REG_END - REG_BASE):
+        """ Bulk read [start, start + count) into the image, BULK_MAX bytes per ioctl. Returns the bytes. """
+        if start < 0 or start + count > SERIAL_BASE:
+            raise ValueError(f"Bulk range 0x{start:x}+{count} reaches the UART fifo window")
+        if start + count > len(self.image):
+            self.image.extend(bytes(start + count - len(self.image)))
+        for chunk in range(start, start + count, BULK_MAX):
+            n = min(BULK_MAX, start + count - chunk)
+            self._io.data[0] = chunk
+            self._io.len = n
+            self.dev.ioctl(LVDS_CMD_GET_REGS, self._io)
+            self.ioctls += 1
+            self.image[chunk:chunk + n] = bytes(self._io.data[:n])
+        self.loaded.update(range(start, start + count))
+        return bytes(self.image[start:start + count])
+
+    @property
+    def valid(self):
+        return self.loaded.issuperset(range(REG_BASE, REG_END))
+
+    def refresh(self):
+        self.read()
+        return self
+
+    def write(self, start, data):
+        """ Bulk write `data` to the registers from `start` on (see the SET_REGS note at the top). """
+        data = bytes(data)
+        if start - 1 < REG_BASE or _writable(start - 1):
+            raise ValueError(f"Register 0x{start - 1:x} would be overwritten with its address")
+        if len(data) > BULK_MAX - 1 or start + len(data) > SERIAL_BASE:
+            raise ValueError(f"Bulk write of {len(data)} bytes at 0x{start:x} does not fit one transfer")
+        self._io.data[0] = start - 1
+        self._io.data[1:1 + len(data)] = data
+        self._io.len = 1 + len(data)
+        self.dev.ioctl(LVDS_CMD_SET_REGS, self._io)
+        self.ioctls += 1
+        self.image[start:start + len(data)] = data
+        self.loaded.update(range(start, start + len(data)))
+
+    def __getitem__(self, name):
+        reg = REGISTERS[name]
+        if not self.loaded.issuperset(range(reg.address, reg.address + reg.size)):
+            self.read(reg.address, reg.size)
+        return int.from_bytes(self.image[reg.address:reg.address + reg.size], "little")
+
+    def capture(self):
+        """ All registers from one fresh bulk read, {name: value}. """
+        self.refresh()
+        return {name: self[name] for name in REGISTERS}
+
+    def apply(self, values):
+        """
+        Bring the writable registers in `values` ({name: value}) to their values, writing only the
+        byte runs that differ from the cached image. Returns the number of SET_REGS ioctls issued.
+
+        A run that has to start at an earlier writable register (e.g. LVDS_INV from ENABLE on) rewrites
+        that register too: it is read fresh right before the write, which is then read back and
+        verified, so a value the driver changed meanwhile is not replaced by a stale cached one.
+        """
+        if not self.valid:
+            self.refresh()
+        target = bytearray(self.image)
+        requested = set()
+        for name, value in values.items():
+            reg = REGISTERS[name]
+            if not reg.writable:
+                raise ValueError(f"Register {name} is read-only")
+            target[reg.address:reg.address + reg.size] = value.to_bytes(reg.size, "little")
+            requested.update(range(reg.address, reg.address + reg.size))
+        changed = [a for a in range(len(target)) if target[a] != self.image[a]]
+        writes = 0
+        while changed:
+            start = end = changed.pop(0)
+            while changed and changed[0] == end + 1:
+                end = changed.pop(0)
+            while _writable(start - 1):       # run must begin right after a read-only register
+                start -= 1
+            swept = [a for a in range(start, end + 1) if a not in requested]
+            if swept:
+                fresh = self.read(start, end + 1 - start)
+                for a in swept:
+                    target[a] = fresh[a - start]
+            self.write(start, target[start:end + 1])
+            writes += 1
+            if swept and self.read(start, end + 1 - start) != target[start:end + 1]:
+                raise RuntimeError(f"Registers 0x{start:x}..0x{end:x} changed while being written")
+        return writes
+
+    def restore(self, state):
+        """ Write back the writable part of a capture(). """
+        return self.apply({name: v for name, v in state.items() if REGISTERS[name].writable})
@@ -0,0 +1,135 @@
+#! /usr/bin/env python3
+# SPDX-License-Identifier: GPL-2.0
+#
+# Priority command scheduler in front of a serial device: interactive control first,
+# configuration next, background inquiries last, with per-class rate limits.
+#
+
+import threading
+from collections import deque
+from concurrent.futures import Future
+from time import monotonic
+from vdlg_lvds.visca import ViscaFrame, ACK, command_axis
+
+INTERACTIVE = 0     # operator control: zoom/pan/focus
+CONFIG      = 1     # configuration changes
+BACKGROUND  = 2     # status polling / inquiries
+
+CLASSES = (INTERACTIVE, CONFIG, BACKGROUND)
+
+class _Job():
+    __slots__ = ("data", "key", "kwargs", "future", "queued")
+    def __init__(self, data, key, kwargs):
+        self.data = bytes(data)
+        self.key = key
+        self.kwargs = kwargs
+        self.future = Future()
+        self.queued = monotonic()
+
+class CommandScheduler():
+    """
+    Runs serial.transceive() jobs from one worker thread, always picking the highest priority class
+    that is within its rate limit (`rates`: class -> max transactions per second, None for unlimited).
+    A job submitted with the same `key` as a pending job of its class takes its place in the queue;
+    the older job's future is cancelled. Background jobs are keyed by their command bytes unless a key is given,
+    so repeated polls of the same inquiry never pile up. Jobs without a priority are INTERACTIVE.
+    """
+    def __init__(self, serial, rates=None):
+        self.serial = serial
+        self.rates = {INTERACTIVE: None, CONFIG: None, BACKGROUND: 10.0}
+        self.rates.update(rates or {})
+        self._queues = {cls: deque() for cls in CLASSES}
+        self._next = {cls: 0.0 for cls in CLASSES}
+        self._cond = threading.Condition()
+        self._stop = False
+        self.stats = {cls: {"sent": 0, "superseded": 0, "max_wait_ms": 0.0, "total_wait_ms": 0.0} for cls in CLASSES}
+        self._worker = threading.Thread(target=self._run, name="lvds-scheduler", daemon=True)
+        self._worker.start()
+
+    def submit(self, data: bytes, priority=INTERACTIVE, key=None, **kwargs):
+        """ Queue a transceive(data, **kwargs) in class `priority`. Returns a Future for the reply. """
+        if key is None and priority == BACKGROUND:
+            key = bytes(data)
+        job = _Job(data, key, kwargs)
+        with self._cond:
+            if self._stop:
+                raise RuntimeError("scheduler is closed")
+            queue = self._queues[priority]
+            for idx, old in enumerate(queue):
+                if key is not None and old.key == key:
+                    queue[idx] = job
+                    old.future.cancel()
+                    self.stats[priority]["superseded"] += 1
+                    break
+            else:
+                queue.append(job)
+            self._cond.notify()
+        return job.future
+
+    def transceive(self, data: bytes, priority=INTERACTIVE, key=None, timeout=None, **kwargs):
+        return self.submit(data, priority, key, **kwargs).result(timeout)
+
+    def close(self):
+        with self._cond:
+            self._stop = True
+            for queue in self._queues.values():
+                while queue:
+                    queue.popleft().future.cancel()
+            self._cond.notify()
+        self._worker.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _pick(self):
+        # highest priority class with work that is allowed to send now, else how long until one is
+        now = monotonic()
+        wait = None
+        for cls in CLASSES:
+            if self._queues[cls]:
+                if self._next[cls] <= now:
+                    return cls, None
+                delay = self._next[cls] - now
+                wait = delay if wait is None else min(wait, delay)
+        return None, wait
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    if self._stop:
+                        return
+                    cls, wait = self._pick()
+                    if cls is not None:
+                        break
+                    self._cond.wait(wait)
+                job = self._queues[cls].popleft()
+                if self.rates[cls]:
+                    self._next[cls] = monotonic() + 1.0 / self.rates[cls]
+            if not job.future.set_running_or_notify_cancel():
+                continue
+            st = self.stats[cls]
+            waited = (monotonic() - job.queued) * 1000
+            st["max_wait_ms"] = max(st["max_wait_ms"], waited)
+            st["total_wait_ms"] += waited
+            st["sent"] += 1
+            try:
+                job.future.set_result(self.serial.transceive(job.data, **job.kwargs))
+            except Exception as e:
+                job.future.set_exception(e)
+
+class CoalescingQueue(CommandScheduler):
+    """
+    Latest-wins queue for joystick style control. Commands are keyed by the VISCA axis they drive,
+    so only the newest pending zoom / focus / pan-tilt / ... command per axis is kept, and each goes
+    out once the previous transaction is acknowledged (transceive completes on the ACK).
+    Commands that drive no axis are sent in order.
+    """
+    def submit(self, data: bytes, priority=INTERACTIVE, key=None, **kwargs):
+        if key is None:
+            key = command_axis(data)
+        kwargs.setdefault("frame", ViscaFrame(ACK))
+        return super().submit(data, priority, key, **kwargs)
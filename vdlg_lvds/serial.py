@@ -7,71 +7,243 @@
 from time import sleep, time_ns
 import argparse
 import threading
-import fcntl
+import select
+import termios
+import re
+import sys
+import json
 from vdlg_lvds.ioctl import *
+from vdlg_lvds.visca import ViscaFrame
+from vdlg_lvds.timing import AdaptiveTiming
 import glob
 
-class LvdsSerial():
-    def __init__(self, dev_path, start_wait_ms=100, stop_wait_ms=120, baud=9600):
+class RxRing():
+    """
+    Bounded byte ring filled by the RX reader thread. When full, the oldest bytes are dropped
+    and counted in `overflow`. read() is non-blocking with timeout=0, blocks with timeout=None
+    and waits at most `timeout` seconds otherwise.
+    """
+    def __init__(self, size=4096):
+        self.size = size
+        self.buf = bytearray(size)
+        self.head = 0
+        self.len = 0
+        self.cond = threading.Condition()
+        self.total = 0
+        self.overflow = 0
+        self.high_water = 0
+
+    def __len__(self):
+        return self.len
+
+    def put(self, data):
+        with self.cond:
+            n = len(data)
+            if n > self.size:
+                self.overflow += n - self.size
+                data = data[-self.size:]
+                n = self.size
+            drop = self.len + n - self.size
+            if drop > 0:
+                self.overflow += drop
+                self.head = (self.head + drop) % self.size
+                self.len -= drop
+            tail = (self.head + self.len) % self.size
+            first = min(n, self.size - tail)
+            self.buf[tail:tail + first] = data[:first]
+            self.buf[:n - first] = data[first:]
+            self.len += n
+            self.total += n
+            self.high_water = max(self.high_water, self.len)
+            self.cond.notify_all()
+
+    def wait(self, timeout=None, count=1):
+        """ Wait until at least `count` bytes are buffered. Returns False on timeout. """
+        with self.cond:
+            return self.cond.wait_for(lambda: self.len >= count, timeout)
+
+    def read(self, count=0, timeout=0):
+        """ Up to `count` bytes (all if 0). With a timeout, waits for `count` (or any, if 0) bytes first. """
+        with self.cond:
+            if timeout != 0:
+                self.cond.wait_for(lambda: self.len >= max(count, 1), timeout)
+            n = min(count, self.len) if count else self.len
+            first = min(n, self.size - self.head)
+            data = bytes(self.buf[self.head:self.head + first]) + bytes(self.buf[:n - first])
+            self.head = (self.head + n) % self.size
+            self.len -= n
+            return data
+
+    def clear(self):
+        with self.cond:
+            self.head = self.len = 0
+
+    def stats(self):
+        return {"buffered": self.len, "size": self.size, "total": self.total, "overflow": self.overflow, "high_water": self.high_water}
+
+class LvdsSerial(LvdsDevice):
+    def __init__(self, dev_path, start_wait_ms=100, stop_wait_ms=120, baud=9600, timing=None):
         self.lock = threading.Lock()
-        self.dev = dev_path
+        self.timing = timing            # optional AdaptiveTiming
+        self._t_tx = self._t_first = self._t_last = None
+        self._gap = 0
+        self._tx_done = 0               # estimated time the TX FIFO runs empty
+        self.tx_stats = {"bytes": 0, "chunks": 0, "stalls": 0, "busy_ns": 0}
+        # one preallocated ioctl buffer per operation, reused for every call
+        self._tx = LvdsIoctlSerial()
+        self._rx = LvdsIoctlSerial()
+        self._cnt = LvdsIoctlSerial()
+        self._stat = LvdsIoctlSerial()
+        # optional background RX drain, see start_rx_reader()
+        self.rx_ring = None
+        self._reader = None
+        self._reader_stop = threading.Event()
+        self.rx_stats = {"fifo_high_water": 0, "fifo_full": 0}
+        super().__init__(dev_path)
         self.baud = baud
         self.bwms = start_wait_ms
         self.ewms = stop_wait_ms
         self.set_baud(self.baud)
         self.recv()        # clear RX fifo
 
-    # Open the device file
+    def _byte_ns(self):
+        return 10 * 1e9 / self.baud      # 8N1: 10 bits on the wire per byte
+
+    def _write_fifo(self, chunk):
+        self._tx.len = len(chunk)
+        self._tx.data[:len(chunk)] = chunk
+        self.ioctl(LVDS_CMD_SERIAL_SEND_TX, self._tx)
+
     def send(self, data: bytes):
-        ioctl_serial = LvdsIoctlSerial()
-        ioctl_serial.len = len(data)
-        ioctl_serial.data = (ctypes.c_uint8 * 64)(*data)
-        # Call an IOCTL
-        with open(self.dev) as f:
-            fcntl.ioctl(f, LVDS_CMD_SERIAL_SEND_TX, ioctl_serial)
+        # Payloads larger than the TX FIFO go out in FIFO sized chunks. The FIFO fill level is
+        # estimated from the baud rate, so the next chunk is written while the previous one is
+        # still on the wire; the TX full/empty status bits correct the estimate before each refill.
+        t0 = time_ns()
+        byte_ns = self._byte_ns()
+        view = memoryview(bytes(data))
+        chunks = 0
+        while view:
+            now = time_ns()
+            fill = max(0.0, (self._tx_done - now) / byte_ns)
+            if chunks:
+                empty_tx, full_tx = self.get_uart_status()[2:4]
+                if full_tx:
+                    self.tx_stats["stalls"] += 1
+                    sleep(byte_ns / 1e9)
+                    continue
+                if empty_tx:
+                    fill = 0.0
+            free = int(UART_FIFO_SIZE - fill)
+            want = min(len(view), UART_FIFO_SIZE // 2)
+            if free < want:
+                sleep((want - free) * byte_ns / 1e9)
+                continue
+            n = min(free, len(view))
+            self._write_fifo(view[:n])
+            self._tx_done = max(self._tx_done, now) + n * byte_ns
+            view = view[n:]
+            chunks += 1
+        self._tx_account(len(data), chunks, t0)
+
+    def _tx_account(self, nbytes, chunks, t0):
+        st = self.tx_stats
+        st["bytes"] += nbytes
+        st["chunks"] += chunks
+        # time from the first write until the last byte has left the UART
+        st["busy_ns"] += max(self._tx_done, time_ns()) - t0
+
+    def tx_throughput(self):
+        """ TX counters plus achieved vs. line rate, in bytes/s. """
+        st = dict(self.tx_stats)
+        st["bytes_per_s"] = st["bytes"] * 1e9 / st["busy_ns"] if st["busy_ns"] else 0.0
+        st["line_rate"] = self.baud / 10
+        return st
+
+    def _fifo_read(self, count:int=0):
+        self._rx.len = count
+        self.ioctl(LVDS_CMD_SERIAL_RECV_RX, self._rx)
+        return ctypes.string_at(self._rx.data, self._rx.len)
 
+    def _fifo_count(self):
+        self.ioctl(LVDS_CMD_SERIAL_RX_CNT, self._cnt)
+        return self._cnt.len
+
+    # with the RX reader running, the FIFO belongs to the reader thread and RX is served from the ring
     def recv(self, count:int=0):
-        ioctl_serial = LvdsIoctlSerial()
-        ioctl_serial.len = count
-        with open(self.dev) as f:
-            fcntl.ioctl(f, LVDS_CMD_SERIAL_RECV_RX, ioctl_serial)
-        return bytes(ioctl_serial.data[:ioctl_serial.len])
+        if self.rx_ring is not None:
+            return self.rx_ring.read(count)
+        return self._fifo_read(count)
 
     def get_rx_count(self):
-        ioctl_serial = LvdsIoctlSerial()
-        with open(self.dev) as f:
-            fcntl.ioctl(f, LVDS_CMD_SERIAL_RX_CNT, ioctl_serial)
-        return ioctl_serial.len
+        if self.rx_ring is not None:
+            return len(self.rx_ring)
+        return self._fifo_count()
+
+    def start_rx_reader(self, rate_hz=500, size=4096):
+        """ Drain the RX FIFO from a background thread into a RxRing of `size` bytes, polling at `rate_hz`. """
+        if self._reader is not None:
+            return self.rx_ring
+        ring = RxRing(size)
+        ring.put(self._fifo_read())
+        self._reader_stop.clear()
+        self._reader = threading.Thread(target=self._rx_reader, args=(ring, 1.0 / rate_hz), name=f"lvds-rx {self.dev}", daemon=True)
+        self.rx_ring = ring
+        self._reader.start()
+        return ring
+
+    def stop_rx_reader(self):
+        if self._reader is not None:
+            self._reader_stop.set()
+            self._reader.join()
+            self._reader = None
+            self.rx_ring = None
+
+    def _rx_reader(self, ring, period):
+        st = self.rx_stats
+        while not self._reader_stop.wait(period):
+            try:
+                cnt = self._fifo_count()
+                if cnt:
+                    st["fifo_high_water"] = max(st["fifo_high_water"], cnt)
+                    if cnt >= UART_FIFO_SIZE:
+                        st["fifo_full"] += 1     # bytes may have been lost in the FPGA
+                    ring.put(self._fifo_read(cnt))
+            except OSError:
+                if self._reader_stop.is_set() or self.fd is None:
+                    break
+
+    def close(self):
+        self.stop_rx_reader()
+        super().close()
+
+    def _reg_ioctl(self, cmd, buf):
+        # FPGA register access; the TTY backend routes it to the sub-device node
+        return self.ioctl(cmd, buf)
 
     def get_rx_last_byte(self):
-        ioctl_serial = LvdsIoctlSerial()
-        with open(self.dev) as f:
-            fcntl.ioctl(f, LVDS_CMD_SERIAL_RX_LAST, ioctl_serial)
-        return ioctl_serial.len
+        self._reg_ioctl(LVDS_CMD_SERIAL_RX_LAST, self._stat)
+        return self._stat.len
 
     def get_uart_status(self):
-        ioctl_serial = LvdsIoctlSerial()
-        with open(self.dev) as f:
-            fcntl.ioctl(f, LVDS_CMD_GET_UART_STATUS, ioctl_serial)
-        empty_rx = ioctl_serial.len & 0x1
-        full_rx  = ioctl_serial.len & 0x2
-        empty_tx = ioctl_serial.len & 0x4
-        full_tx  = ioctl_serial.len & 0x8
-        busy_rx  = ioctl_serial.len & 0x10
-        busy_tx  = ioctl_serial.len & 0x20
+        self._reg_ioctl(LVDS_CMD_GET_UART_STATUS, self._stat)
+        status = self._stat.len
+        empty_rx = status & 0x1
+        full_rx  = status & 0x2
+        empty_tx = status & 0x4
+        full_tx  = status & 0x8
+        busy_rx  = status & 0x10
+        busy_tx  = status & 0x20
         return empty_rx, full_rx, empty_tx, full_tx, busy_rx, busy_tx
 
     def get_baud(self):
-        ioctl_serial = LvdsIoctlSerial()
-        with open(self.dev) as f:
-            fcntl.ioctl(f, LVDS_CMD_SERIAL_BAUD, ioctl_serial)
-        return ioctl_serial.len
+        self._stat.len = 0
+        self.ioctl(LVDS_CMD_SERIAL_BAUD, self._stat)
+        return self._stat.len
 
     def set_baud(self, baud:int):
-        ioctl_serial = LvdsIoctlSerial()
-        ioctl_serial.len = baud
-        with open(self.dev) as f:
-            fcntl.ioctl(f, LVDS_CMD_SERIAL_BAUD, ioctl_serial)
+        self._stat.len = baud
+        self.ioctl(LVDS_CMD_SERIAL_BAUD, self._stat)
+        self.baud = baud
 
     def wait_for_rx_stable(self, start_wait_ms, stop_wait_ms):
         start = time_ns()
@@ -79,31 +251,343 @@ class LvdsSerial():
             sleep(0.002)
             if time_ns() - start > start_wait_ms*1e6:
                 return False
+        self._rx_seen()
         byte_count = self.get_rx_count()
         start = time_ns()
         while time_ns() - start < stop_wait_ms*1e6:
             sleep(0.002)
             cnt = self.get_rx_count()
             if cnt != byte_count:
+                self._rx_seen()
                 byte_count = cnt
                 start = time_ns()
         return True
 
-    def transceive(self, data: bytes, count:int=0, start_wait_ms=None, stop_wait_ms=None):
+    def wait_for_reply(self, frame, start_wait_ms, stop_wait_ms):
+        # drain RX as it arrives and return as soon as `frame` says the reply is complete.
+        # The start/stop waits are only the fallback for replies the detector never accepts.
+        buf = bytearray()
+        start = time_ns()
+        limit = start_wait_ms*1e6
+        while True:
+            cnt = self.get_rx_count()
+            if cnt:
+                self._rx_seen()
+                buf += self.recv(cnt)
+                if frame(buf):
+                    break
+                start = time_ns()
+                limit = stop_wait_ms*1e6
+            elif time_ns() - start > limit:
+                break
+            sleep(0.002)
+        return bytes(buf)
+
+    def _wait_ring(self, frame, start_wait_ms, stop_wait_ms):
+        # same semantics as wait_for_reply/wait_for_rx_stable, but sleeping on the ring instead of polling
+        buf = bytearray()
+        limit = start_wait_ms
+        while self.rx_ring.wait(limit / 1000):
+            self._rx_seen()
+            buf += self.rx_ring.read()
+            if frame is not None and frame(buf):
+                break
+            limit = stop_wait_ms
+        return bytes(buf)
+
+    def _rx_seen(self):
+        # reply timestamps of the current transaction, relative to the end of TX
+        now = time_ns()
+        if self._t_first is None:
+            self._t_first = now
+        else:
+            self._gap = max(self._gap, now - self._t_last)
+        self._t_last = now
+
+    @property
+    def last_timing(self):
+        """ (first byte, last byte, largest inter-byte gap) in ms of the last transceive, None if nothing came back. """
+        if self._t_first is None:
+            return None
+        return (self._t_first - self._t_tx) / 1e6, (self._t_last - self._t_tx) / 1e6, self._gap / 1e6
+
+    def transceive(self, data: bytes, count:int=0, start_wait_ms=None, stop_wait_ms=None, frame=None):
+        learned = None
+        if self.timing is not None and (start_wait_ms is None or stop_wait_ms is None):
+            learned = self.timing.waits(self.dev, data, self.baud)
         if start_wait_ms is None:
-            start_wait_ms = self.bwms
+            start_wait_ms = learned[0] if learned else self.bwms
         if stop_wait_ms is None:
-            stop_wait_ms = self.ewms
+            stop_wait_ms = learned[1] if learned else self.ewms
         with self.lock:
             self.recv()
             self.send(data)
-            self.wait_for_rx_stable(start_wait_ms, stop_wait_ms)
-            data = self.recv(count)
+            self._t_tx = time_ns()
+            self._t_first = self._t_last = None
+            self._gap = 0
+            if self.rx_ring is not None:
+                reply = self._wait_ring(frame, start_wait_ms, stop_wait_ms)
+            elif frame is None:
+                self.wait_for_rx_stable(start_wait_ms, stop_wait_ms)
+                reply = self.recv(count)
+            else:
+                reply = self.wait_for_reply(frame, start_wait_ms, stop_wait_ms)
+            self._learn(data, learned, frame is None or frame(reply))
+            if count:
+                reply = reply[:count]
+        return reply
+
+    def _learn(self, data, learned, complete):
+        # feed the reply timing of the last transaction to self.timing. A reply that never came, or that
+        # the frame detector did not accept, means learned waits cut it off: drop them and relearn.
+        if self.timing is None:
+            return
+        if complete and self.last_timing is not None:
+            self.timing.record(self.dev, data, *self.last_timing)
+        elif learned:
+            self.timing.miss(self.dev, data)
+
+# socket of the vdlg-lvds-daemon multiplexer
+DEFAULT_SOCKET = os.environ.get("VDLG_LVDS_SOCKET", "/run/vdlg-lvds.sock")
+
+# TTY front-end of the same UART, registered by crosslink-tty.c as /dev/ttyVISCA<csi_id>
+TTY_NAME = "ttyVISCA"
+TTY_BAUDS = {int(b[1:]): getattr(termios, b) for b in dir(termios) if b[0] == "B" and b[1:].isdigit()}
+
+class LvdsTtySerial(LvdsSerial):
+    """
+    LvdsSerial interface over the crosslink TTY node. Baud goes through termios and waiting is
+    done in poll(), so an idle client sleeps in the kernel instead of polling LVDS_CMD_SERIAL_RX_CNT.
+    get_uart_status/get_rx_last_byte read the FPGA registers through the sub-device node `ctrl`
+    (resolved from the csi_id in sysfs when not given).
+    """
+    def __init__(self, tty_path, start_wait_ms=100, stop_wait_ms=120, baud=9600, timing=None, ctrl=None):
+        self.ctrl = ctrl
+        self._ctrl = None
+        self._pending = bytearray()
+        self._avail = ctypes.c_int()
+        self._poller = None
+        super().__init__(tty_path, start_wait_ms, stop_wait_ms, baud, timing)
+
+    def open(self):
+        if self.fd is None:
+            fd = os.open(self.dev, os.O_RDWR | os.O_NOCTTY | os.O_NONBLOCK | os.O_CLOEXEC)
+            # raw 8N1, like tty.setraw(). A re-opened node starts at the driver default baud again.
+            attrs = termios.tcgetattr(fd)
+            attrs[0] = 0
+            attrs[1] = 0
+            attrs[2] = (attrs[2] & ~(termios.CSIZE | termios.PARENB | termios.CSTOPB)) | termios.CS8 | termios.CREAD | termios.CLOCAL
+            attrs[3] = 0
+            if getattr(self, "baud", None) in TTY_BAUDS:
+                attrs[4] = attrs[5] = TTY_BAUDS[self.baud]
+            termios.tcsetattr(fd, termios.TCSANOW, attrs)
+            self._poller = select.poll()
+            self._poller.register(fd, select.POLLIN)
+            self.fd = fd
+        return self
+
+    def _poll_in(self, timeout_ms):
+        for _, events in self._poller.poll(timeout_ms):
+            if events & select.POLLIN:
+                return True
+            if events & (select.POLLHUP | select.POLLERR | select.POLLNVAL):
+                self.reopen()
+        return False
+
+    def _read_available(self):
+        try:
+            while True:
+                chunk = os.read(self.fd, 4096)
+                self._pending += chunk
+                if len(chunk) < 4096:
+                    break
+        except BlockingIOError:
+            pass
+        except OSError as e:
+            if e.errno not in REOPEN_ERRNOS + (errno.EIO,):
+                raise
+            self.reopen()
+
+    def send(self, data: bytes):
+        # the driver writes straight into the 32 byte FIFO: wait for it to drain (tcdrain) between chunks
+        t0 = time_ns()
+        view = memoryview(bytes(data))
+        chunks = 0
+        while view:
+            if chunks:
+                termios.tcdrain(self.fd)
+            chunk = view[:UART_FIFO_SIZE]
+            while chunk:
+                try:
+                    chunk = chunk[os.write(self.fd, chunk):]
+                except BlockingIOError:
+                    select.select([], [self.fd], [], 1.0)
+            view = view[UART_FIFO_SIZE:]
+            chunks += 1
+        self._tx_done = time_ns() + min(len(data), UART_FIFO_SIZE) * self._byte_ns()
+        self._tx_account(len(data), chunks, t0)
+
+    def recv(self, count:int=0):
+        self._read_available()
+        n = min(count, len(self._pending)) if count else len(self._pending)
+        data = bytes(self._pending[:n])
+        del self._pending[:n]
         return data
 
+    def get_rx_count(self):
+        self.ioctl(termios.FIONREAD, self._avail)
+        return len(self._pending) + self._avail.value
+
+    def _reg_ioctl(self, cmd, buf):
+        if self._ctrl is None:
+            if self.ctrl is None:
+                self.ctrl = ctrl_for(self.dev)
+            if self.ctrl is None:
+                raise OSError(errno.ENODEV, f"No LVDS sub-device found for {self.dev}")
+            self._ctrl = LvdsDevice(self.ctrl)
+        return self._ctrl.ioctl(cmd, buf)
+
+    def close(self):
+        if self._ctrl is not None:
+            self._ctrl.close()
+            self._ctrl = None
+        super().close()
+
+    def start_rx_reader(self, rate_hz=500, size=4096):
+        # crosslink-tty already drains the FIFO into the TTY buffer while the node is open: nothing to start
+        return None
+
+    def get_baud(self):
+        speed = termios.tcgetattr(self.open().fd)[5]
+        return next(b for b, s in TTY_BAUDS.items() if s == speed)
+
+    def set_baud(self, baud:int):
+        if baud not in TTY_BAUDS:
+            raise ValueError(f"Unsupported TTY baud rate: {baud}")
+        attrs = termios.tcgetattr(self.open().fd)
+        attrs[4] = attrs[5] = TTY_BAUDS[baud]
+        termios.tcsetattr(self.fd, termios.TCSADRAIN, attrs)
+        self.baud = baud
+
+    def wait_for_rx_stable(self, start_wait_ms, stop_wait_ms):
+        if not self._pending and not self._poll_in(start_wait_ms):
+            return False
+        self._rx_seen()
+        self._read_available()
+        while self._poll_in(stop_wait_ms):
+            self._rx_seen()
+            self._read_available()
+        return True
+
+    def wait_for_reply(self, frame, start_wait_ms, stop_wait_ms):
+        buf = bytearray(self.recv())
+        if buf:
+            self._rx_seen()
+            if frame(buf):
+                return bytes(buf)
+        limit = stop_wait_ms if buf else start_wait_ms
+        while self._poll_in(limit):
+            self._rx_seen()
+            buf += self.recv()
+            if frame(buf):
+                break
+            limit = stop_wait_ms
+        return bytes(buf)
+
+SYSFS_V4L = "/sys/class/video4linux"
+
+def _csi_id(node):
+    # the "csi_id" device-tree property crosslink-tty.c numbers the TTY by, None without one
+    try:
+        with open(os.path.join(SYSFS_V4L, node, "device", "of_node", "csi_id"), "rb") as f:
+            return int.from_bytes(f.read(4), "big")
+    except OSError:
+        return None
+
+def tty_for(dev_path):
+    """ TTY node of a bridge: the path itself if it is one, else /dev/ttyVISCA<csi_id> of its sub-device. None if unresolved. """
+    if os.path.basename(dev_path).startswith(TTY_NAME):
+        return dev_path
+    csi_id = _csi_id(os.path.basename(os.path.realpath(dev_path)))
+    return None if csi_id is None else f"/dev/{TTY_NAME}{csi_id}"
+
+def ctrl_for(tty_path):
+    """ Sub-device node of the bridge behind a TTY node, found by its csi_id. None if there is none. """
+    index = os.path.basename(tty_path)[len(TTY_NAME):]
+    try:
+        nodes = sorted(os.listdir(SYSFS_V4L))
+    except OSError:
+        return None
+    for node in nodes:
+        if node.startswith("v4l-subdev") and index.isdigit() and _csi_id(node) == int(index):
+            return f"/dev/{node}"
+    return None
+
+def open_serial(dev_path, tty=None, **kwargs):
+    """
+    Serial access to a bridge: the TTY backend when sysfs maps the sub-device to an existing TTY
+    node, the ioctl backend otherwise. tty=False forces ioctls, a tty path forces that node.
+    """
+    if tty is None:
+        tty = tty_for(dev_path)
+    if tty and os.path.exists(tty):
+        ctrl = None if os.path.basename(dev_path).startswith(TTY_NAME) else dev_path
+        return LvdsTtySerial(tty, ctrl=ctrl, **kwargs)
+    return LvdsSerial(dev_path, **kwargs)
+
+def parse_batch_line(line):
+    # '81090447FF  timeout=200  expect=9050'  ->  (bytes, timeout_ms or None, compiled regex or None)
+    fields = line.split('#', 1)[0].split()
+    if not fields:
+        return None
+    timeout = expect = None
+    for opt in fields[1:]:
+        key, _, val = opt.partition('=')
+        if key in ('t', 'timeout'):
+            timeout = int(val)
+        elif key in ('e', 'expect'):
+            expect = re.compile(val, re.IGNORECASE)
+        else:
+            raise ValueError(f"unknown option: {opt}")
+    return bytes.fromhex(fields[0]), timeout, expect
+
+def run_batch(serial, lines, out, frame=None, timeout=None):
+    """ Run newline separated hex commands over one serial instance, writing one JSON line per command and a summary. """
+    count = failed = 0
+    t_start = time_ns()
+    for lineno, line in enumerate(lines, 1):
+        rec = {"line": lineno}
+        try:
+            cmd = parse_batch_line(line)
+            if cmd is None:
+                continue
+            data, cmd_timeout, expect = cmd
+            rec["cmd"] = data.hex()
+            t = time_ns()
+            reply = serial.transceive(data, start_wait_ms=cmd_timeout or timeout, frame=frame)
+            rec["ms"] = round((time_ns() - t) / 1e6, 3)
+            rec["reply"] = reply.hex()
+            rec["ok"] = bool(reply) and (expect is None or expect.search(reply.hex()) is not None)
+        except (ValueError, OSError, RuntimeError) as e:     # RuntimeError: error reported by the daemon
+            rec["ok"] = False
+            rec["error"] = str(e)
+        count += 1
+        failed += not rec["ok"]
+        out.write(json.dumps(rec) + "\n")
+        out.flush()
+    total_ms = (time_ns() - t_start) / 1e6
+    out.write(json.dumps({"summary": {"commands": count, "failed": failed, "total_ms": round(total_ms, 3),
+                                      "avg_ms": round(total_ms / count, 3) if count else 0}}) + "\n")
+    return failed
+
 example_text = '''
 example:
     %(prog)s -d /dev/links/lvds2mipi_1 81090002FF
+    %(prog)s -d /dev/links/lvds2mipi_1 -b commands.txt
+
+batch file: one hex command per line, optional per-line read timeout and expected reply regex:
+    81090002FF  expect=9050
+    8101041903FF  timeout=500   # comment
 '''
 
 def main():
@@ -115,12 +599,31 @@ def main():
     parser.formatter_class = argparse.RawDescriptionHelpFormatter
     parser.add_argument('-d', '--dev', type=str, default=default_lvds, help='device path')
     parser.add_argument('-t', '--timeout', type=int, default=None, help='read timeout to wait for RX data')
-    parser.add_argument('data', type=str, help='data to send, as hex string')
+    parser.add_argument('-r', '--raw', action='store_true', help='do not parse VISCA replies, always wait for RX to go quiet')
+    parser.add_argument('--ioctl', action='store_true', help='use the ioctl interface even if the TTY node exists')
+    parser.add_argument('-s', '--socket', type=str, nargs='?', const=DEFAULT_SOCKET, default=None, help='send through the vdlg-lvds-daemon socket')
+    parser.add_argument('-a', '--adaptive', action='store_true', help='learn per-command reply timing and reuse it on later runs')
+    parser.add_argument('-b', '--batch', type=argparse.FileType('r'), default=None, help="file of hex commands to run, '-' for stdin. Replies are printed as JSON lines")
+    parser.add_argument('data', type=str, nargs='?', help='data to send, as hex string')
     args = parser.parse_args()
-    data = bytearray.fromhex(args.data)
-    crtvx = LvdsSerial(args.dev)
-
-    data = crtvx.transceive(data, start_wait_ms=args.timeout)
+    if (args.data is None) == (args.batch is None):
+        parser.error("give either a hex command or --batch")
+    if args.socket:
+        from vdlg_lvds.daemon import RemoteSerial, DaemonClient
+        crtvx = RemoteSerial(args.dev, DaemonClient(args.socket))
+    else:
+        timing = AdaptiveTiming() if args.adaptive else None
+        crtvx = open_serial(args.dev, tty=False if args.ioctl else None, timing=timing)
+    frame = None if args.raw else ViscaFrame()
+    with crtvx:
+        try:
+            if args.batch:
+                failed = run_batch(crtvx, args.batch, sys.stdout, frame, args.timeout)
+                sys.exit(1 if failed else 0)
+            data = crtvx.transceive(bytearray.fromhex(args.data), start_wait_ms=args.timeout, frame=frame)
+        finally:
+            if getattr(crtvx, "timing", None) is not None:
+                crtvx.timing.save()
 
     print(data.hex())
 
@@ -1,89 +1,30 @@
 import argparse
-from time import sleep
-from vdlg_lvds.serial import LvdsSerial
+from time import sleep, monotonic
+import threading
+from vdlg_lvds.serial import DEFAULT_SOCKET
+from vdlg_lvds.daemon import connect_serial
+from vdlg_lvds.visca import ViscaFrame, ViscaEngine, ViscaRateController, parse_replies, decode_setter, inquiry_command, PARAMS, ACK, COMPLETION, ERROR
+from vdlg_lvds.get_res import read_timing, timing_matches, wait_for_lock
+from vdlg_lvds.profiles import default_db
+from vdlg_lvds.baud import BaudNegotiator, baud_key
 import glob
 
-resolution_commands = {
-    "sony_ev75xx": {
-        "720p25": ["81010424720101FF", "81010424740000FF", "8101041903FF"],
-        "720p30": ["8101042472000FFF", "81010424740000FF", "8101041903FF"],
-        "720p50": ["8101042472000CFF", "81010424740000FF", "8101041903FF"],
-        "720p60": ["8101042472000AFF", "81010424740000FF", "8101041903FF"],
-        "1080p25": ["81010424720008FF", "81010424740000FF", "8101041903FF"],
-        "1080p30": ["81010424720007FF", "81010424740000FF", "8101041903FF"],
-        "1080p50": ["81010424720104FF", "81010424740001FF", "8101041903FF"],
-        "1080p60": ["81010424720105FF", "81010424740001FF", "8101041903FF"],
-    },
-    "sony_ev95xx": {
-        "720p25": ["81010424720101FF", "81010424740000FF", "8101041903FF"],
-        "720p30": ["8101042472000FFF", "81010424740000FF", "8101041903FF"],
-        "720p50": ["8101042472000CFF", "81010424740000FF", "8101041903FF"],
-        "720p60": ["8101042472000AFF", "81010424740000FF", "8101041903FF"],
-        "1080p25": ["81010424720008FF", "81010424740000FF", "8101041903FF"],
-        "1080p30": ["81010424720007FF", "81010424740000FF", "8101041903FF"],
-        "1080p50": ["81010424720104FF", "81010424740001FF", "8101041903FF"],
-        "1080p60": ["81010424720105FF", "81010424740001FF", "8101041903FF"],
-    },
-    "videology": {
-        "720p25": ["81010424720101FF", "81010424740000FF"],
-        "720p30": ["8101042472000EFF", "81010424740000FF"],
-        "720p50": ["8101042472000CFF", "81010424740000FF"],
-        "720p60": ["81010424720009FF", "81010424740000FF"],
-        "1080p25": ["81010424720008FF", "81010424740000FF"],
-        "1080p30": ["81010424720006FF", "81010424740000FF"],
-        "1080p50": ["81010424720104FF", "81010424740001FF"],
-        "1080p60": ["81010424720103FF", "81010424740001FF"],
-    },
-    "tamron":{
-        "720p25": ["81010424720101FF", "81010424740000FF", "8101041903FF"],
-        "720p30": ["8101042472000FFF", "81010424740000FF", "8101041903FF"],
-        "720p50": ["81010424720006FF", "81010424740000FF", "8101041903FF"],
-        "720p60": ["81010424720005FF", "81010424740000FF", "8101041903FF"],
-        "1080p25": ["81010424720002FF", "81010424740000FF", "8101041903FF"],
-        "1080p30": ["81010424720001FF", "81010424740000FF", "8101041903FF"],
-        "1080p50": ["81010424720008FF", "81010424740001FF", "8101041903FF"],
-        "1080p60": ["81010424720007FF", "81010424740001FF", "8101041903FF"],
-    }
-}
-
-brands = {
-    "sony_ev75xx" : "2006", # Y0 50 00 20 HH HH JJ JJ KK FF
-    "sony_ev95xx" : "2007", #
-                            # Y05000 2006 xxJJJJFF : EV7520A (to be tested)
-                            # Y05000 2007 xxJJJJFF : EV95..L
-                            #             HH HH = 0640: FCB-EV7520A
-                            #             HH HH = 070E: FCB-EV9500L (tested)
-                            #             HH HH = 0711: FCB-EV9520L (tested)
-    "videology": "2004",    # Y0 50 00 20 mn pq rs tu vw FF
-                            # Y05000 2004 66tuvwFF
-                            #             mn pq = 0466: 24Z2.1-10X-LVDS-462 (tested)
-                            #             mn pq = 0466: 24Z2.1-20X-LVDS     (tested)
-                            #             mn pq = 0466: 24Z2.1-30X-LVDS-462 (tested)
-                            #             mn pq = 0466: 24Z2.1-40X          (tested)
-                            #             mn pq = 0466: 24Z2.1-55X          (tested)
-                            #             mn pq = 0466: 25Z2.4-36X Global shutter (tested)
-
-    "tamron"   : "23F0"     # Y0 50 00 23 HH HH JJ JJ KK FF
-                            # Y05000 23F0 1xJJJJFF
-                            #             HH HH = F011: MP1010-VC
-                            #             HH HH = F017: MP3010M-EV  (tested)
-}
-
 def poll_command(serial_device, command, retries=2, delay=0):
     if retries < 1:
-        return serial_device.transceive(bytearray.fromhex(command)).hex()
+        return serial_device.transceive(command, frame=ViscaFrame()).hex()
     else:
         for _ in range(retries):
-            response = serial_device.transceive(bytearray.fromhex(command)).hex()
-            if "9041ff" in response:
+            response = serial_device.transceive(command, frame=ViscaFrame()).hex()
+            kinds = [r.kind for r in parse_replies(bytes.fromhex(response))]
+            if ACK in kinds and ERROR not in kinds:
                 return response
             sleep(delay)
-            print(f"polling {command}")
-        raise RuntimeError(f"Failed to execute command: {command}")
+            print(f"polling {command.hex().upper()}")
+        raise RuntimeError(f"Failed to execute command: {command.hex().upper()}")
 
 def poll_status(serial_device, retries=50, delay=0.1):
     for poll in range(retries):
-        response = serial_device.transceive(bytearray.fromhex("81090400FF")).hex()
+        response = serial_device.transceive(bytearray.fromhex("81090400FF"), frame=ViscaFrame()).hex()
         if "9050" in response:
             if poll > 5:
                 print(f"Camera status okay")
@@ -91,31 +32,195 @@ def poll_status(serial_device, retries=50, delay=0.1):
         sleep(delay)
         print(f"polling camera status")
 
+def brand_from_version(response):
+    # profile name for a version reply or payload (bytes or hex), None for unknown cameras
+    profile = default_db().lookup(response)
+    return profile.name if profile else None
+
 def detect_camera_brand(serial_device):
-    response = serial_device.transceive(bytearray.fromhex("81090002FF")).hex().upper()
-    for brand, code in brands.items():
-        if code in response:
-            print(f"Camera ID response: {response} with {code}.\nDetected {brand.upper()} zoomblock")
-            return brand
-    raise ValueError(f"Unknown camera: {response}")
-
-def set_resolution(serial_device, resolution, brand):
-    if brand.lower() not in resolution_commands:
+    response = serial_device.transceive(bytearray.fromhex("81090002FF"), frame=ViscaFrame())
+    brand = brand_from_version(response)
+    if brand is None:
+        raise ValueError(f"Unknown camera: {response.hex().upper()}")
+    print(f"Camera ID response: {response.hex().upper()}.\nDetected {brand.upper()} zoomblock")
+    return brand
+
+def current_value(serial_device, name):
+    # value of a PARAMS register as the camera reports it, None if it does not answer
+    reply = serial_device.transceive(inquiry_command(name), frame=ViscaFrame())
+    answer = next((r for r in parse_replies(reply) if r.kind == COMPLETION), None)
+    if answer is None or len(answer.payload) != PARAMS[name][2]:
+        return None
+    return answer.payload
+
+def needed_commands(serial_device, steps, resolution, dev=None):
+    """
+    The part of the profile `steps` needed to reach `resolution`: setters whose register already holds the
+    target value are dropped, and the apply/reset is skipped when nothing changes and the FPGA
+    counters (when `dev` is given) already measure the target video timing.
+    """
+    setters = [s for s in steps if not s.apply]
+    applies = [s for s in steps if s.apply]
+    changed = []
+    for step in setters:
+        decoded = decode_setter(step.cmd)
+        if decoded is None or decoded[1] is None or current_value(serial_device, decoded[0]) != decoded[1]:
+            changed.append(step)
+    video_ok = None
+    if dev is not None:
+        try:
+            video_ok = timing_matches(read_timing(dev), resolution)
+        except OSError:
+            pass
+    if changed:
+        return changed + applies
+    if video_ok is False:
+        # registers already hold the mode but the video does not run it yet: apply only
+        return applies or setters
+    return []
+
+def set_resolution(serial_device, resolution, brand, dev=None, force=False):
+    profile = default_db().get(brand)
+    if profile is None:
         raise ValueError(f"Unsupported camera: {brand}")
     else:
-        if resolution not in resolution_commands[brand.lower()]:
+        if resolution not in profile.modes:
             raise ValueError(f"Unsupported resolution: {resolution}")
         else:
-            commands = resolution_commands[brand].get(resolution)
-            for command in commands:
-                retry = 0 if "1041903" in command else 2
+            steps = profile.modes[resolution]
+            if not force:
+                steps = needed_commands(serial_device, steps, resolution, dev)
+                if not steps:
+                    print(f"Camera already in {resolution}")
+                    return 0.0
+            if hasattr(serial_device, "get_rx_count"):
+                run_pipelined(serial_device, steps)
+            else:
+                for step in steps:
+                    retry = 0 if step.apply else 2
+                    try:
+                        res = poll_command(serial_device, step.cmd, retries=retry)
+                    except RuntimeError as e:
+                        print(f"Failed to exec cmd {step.cmd.hex().upper()}")
+                    else:
+                        print(f"cmd: {step.cmd.hex().upper()}, res: {res}")
+                    if step.wait_ms:
+                        sleep(step.wait_ms / 1000)
+            lock = None
+            if dev is not None:
                 try:
-                    res = poll_command(serial_device, command, retries=retry)
-                except RuntimeError as e:
-                    print(f"Failed to exec cmd {command}")
-                else:
-                    print(f"cmd: {command}, res: {res}")
-            poll_status(serial_device)
+                    lock = wait_for_lock(dev, resolution)
+                except OSError as e:
+                    print(f"Cannot read the video timing of {dev}: {e}")
+                    dev = None
+            if dev is None:
+                poll_status(serial_device)
+                return None
+            if lock is None:
+                print(f"Video did not lock to {resolution}")
+            else:
+                print(f"Video locked to {resolution} after {lock * 1000:.0f} ms")
+            return lock
+
+def run_pipelined(serial_device, steps, retries=2, rate=None):
+    # mode setters run pipelined over both VISCA sockets, the apply/reset only after all of them completed.
+    # buffer-full / not-executable rejects are paced and re-sent by the rate controller.
+    if rate is None:
+        rate = ViscaRateController()
+    engine = ViscaEngine(serial_device, rate=rate)
+    setters = [s for s in steps if not s.apply]
+    results = engine.run([s.cmd for s in setters])
+    for _ in range(retries - 1):
+        failed = [i for i, r in enumerate(results) if not r.ok]
+        if not failed:
+            break
+        print(f"retrying {[results[i].cmd.hex().upper() for i in failed]}")
+        for i, r in zip(failed, engine.run([results[i].cmd for i in failed])):
+            results[i] = r
+    observe = getattr(serial_device, "observe", None)      # keep a ShadowState in sync
+    for r in results:
+        if observe:
+            observe(r.cmd, r.reply)
+        if r.ok:
+            print(f"cmd: {r.cmd.hex().upper()}, res: {r.reply.hex()}")
+        else:
+            print(f"Failed to exec cmd {r.cmd.hex().upper()}")
+    settle = max((s.wait_ms or 0 for s in setters), default=0)
+    if settle:
+        sleep(settle / 1000)
+    for step in steps:
+        if step.apply:
+            r = engine.execute(step.cmd, until=ACK)
+            if observe:
+                observe(r.cmd, r.reply)
+            print(f"cmd: {step.cmd.hex().upper()}, res: {r.reply.hex()}")
+            if step.wait_ms:
+                sleep(step.wait_ms / 1000)
+    print(f"command rate: {rate.stats()}")
+    return results
+
+def resume_baud(serial_device, dev, baud):
+    # start at the rate negotiated in an earlier session, if the camera still answers there
+    rate = BaudNegotiator(serial_device, key=baud_key(dev)).resume(default=baud)
+    print(f"{dev}: {rate} baud")
+    return rate
+
+def negotiate_baud(serial_device, brand, dev):
+    # fastest rate the profile can switch the camera to live; profiles without baud commands stay put
+    profile = default_db().get(brand)
+    if not profile.bauds:
+        return serial_device.baud
+    negotiator = BaudNegotiator(serial_device, key=baud_key(dev, brand))
+    rate = negotiator.negotiate(lambda r: serial_device.send(profile.bauds[r]), rates=[*profile.bauds, serial_device.baud])
+    print(f"{dev}: negotiated {rate} baud")
+    return rate
+
+def provision(dev, resolution, socket_path=None, force=False, baud=9600, negotiate=False, step=print):
+    """ Brand detection, serial setup and mode switch of one camera. `step(name)` is called as each stage starts. """
+    step(f"open @ {baud} baud")
+    serial_device = connect_serial(dev, socket_path, baud=baud)
+    if negotiate:
+        step("resume baud")
+        resume_baud(serial_device, dev, baud)
+    step("detect")
+    brand = detect_camera_brand(serial_device)
+    if negotiate:
+        step("negotiate baud")
+        negotiate_baud(serial_device, brand, dev)
+    step(f"set {resolution} ({brand})")
+    lock = set_resolution(serial_device, resolution, brand, dev=dev, force=force)
+    step("done")
+    return lock
+
+def provision_all(devs, resolution, socket_path=None, force=False, baud=9600, negotiate=False):
+    """
+    Provision every bridge in `devs` at once with a worker thread per device, then print the
+    per-camera timeline and the total wall-clock time. Returns {dev: lock time, or the exception}.
+    """
+    start = monotonic()
+    timeline = []
+    results = {}
+    lock = threading.Lock()
+
+    def worker(dev):
+        def step(name):
+            with lock:
+                timeline.append((monotonic() - start, dev, name))
+        try:
+            results[dev] = provision(dev, resolution, socket_path, force, baud, negotiate, step)
+        except Exception as e:
+            step(f"failed: {e}")
+            results[dev] = e
+
+    threads = [threading.Thread(target=worker, args=(dev,), name=dev) for dev in devs]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    for t, dev, name in sorted(timeline):
+        print(f"{t * 1000:8.0f} ms  {dev}: {name}")
+    print(f"{len(devs)} cameras in {(monotonic() - start) * 1000:.0f} ms")
+    return results
 
 def main():
     lvds_devs = glob.glob("/dev/links/lvds*")
@@ -123,11 +228,25 @@ def main():
     parser = argparse.ArgumentParser(description="Set camera resolution via LvdsSerial")
     parser.add_argument("resolution", type=str, help="Resolution in the form of '720p60'")
     parser.add_argument("-d", "--dev", type=str, default=default_lvds, help="Device path")
+    parser.add_argument("-a", "--all", action="store_true", help="Provision every /dev/links/lvds* bridge in parallel")
+    parser.add_argument("-b", "--baud", type=int, default=9600, help="VISCA baud rate")
+    parser.add_argument("-n", "--negotiate", action="store_true", help="Resume the last negotiated baud rate and step up to the fastest the camera supports")
+    parser.add_argument("-f", "--force", action="store_true", help="Send the whole mode sequence even if the camera is already in that mode")
+    parser.add_argument("-s", "--socket", type=str, nargs="?", const=DEFAULT_SOCKET, default=None, help="Send through the vdlg-lvds-daemon socket")
     args = parser.parse_args()
 
-    serial_device = LvdsSerial(args.dev)
+    if args.all:
+        results = provision_all(sorted(lvds_devs), args.resolution, args.socket, args.force, args.baud, args.negotiate)
+        if any(isinstance(r, Exception) for r in results.values()):
+            raise SystemExit(1)
+        return
+    serial_device = connect_serial(args.dev, args.socket, baud=args.baud)
+    if args.negotiate:
+        resume_baud(serial_device, args.dev, args.baud)
     brand = detect_camera_brand(serial_device)
-    set_resolution(serial_device, args.resolution, brand)
+    if args.negotiate:
+        negotiate_baud(serial_device, brand, args.dev)
+    set_resolution(serial_device, args.resolution, brand, dev=args.dev, force=args.force)
 
 if __name__ == "__main__":
     main()
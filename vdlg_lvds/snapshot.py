@@ -0,0 +1,130 @@
+#! /usr/bin/env python3
+# SPDX-License-Identifier: GPL-2.0
+#
+# Full camera state snapshot from pipelined VISCA inquiries, and restore onto the same or another camera.
+#
+
+import argparse
+import glob
+import json
+from dataclasses import dataclass, asdict, fields
+from typing import Optional
+from vdlg_lvds.visca import *
+from vdlg_lvds.set_res import brand_from_version
+
+# AE modes in which the direct iris / shutter / gain values are applied
+AE_MANUAL, AE_SHUTTER_PRIO, AE_IRIS_PRIO = 0x03, 0x0A, 0x0B
+FOCUS_MANUAL = 0x03
+
+@dataclass
+class CameraSnapshot:
+    brand: Optional[str] = None
+    version: Optional[str] = None           # raw inquiry payload, hex: vendor, model, rom version, socket count
+    ae_mode: Optional[int] = None
+    wb_mode: Optional[int] = None
+    focus_mode: Optional[int] = None
+    zoom: Optional[int] = None
+    focus: Optional[int] = None
+    iris: Optional[int] = None
+    shutter: Optional[int] = None
+    gain: Optional[int] = None
+    monitoring_mode: Optional[int] = None
+    lvds_mode: Optional[int] = None
+
+    def to_dict(self):
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, d):
+        names = {f.name for f in fields(cls)}
+        return cls(**{k: v for k, v in d.items() if k in names})
+
+SNAPSHOT_PARAMS = tuple(f.name for f in fields(CameraSnapshot) if f.name in PARAMS)
+
+def decode_value(name, value):
+    # multi byte values are sent as one nibble per byte: 0p 0q 0r 0s
+    if name == "version":
+        return value.hex()
+    if len(value) == 1:
+        return value[0]
+    n = 0
+    for b in value:
+        n = (n << 4) | (b & 0x0F)
+    return n
+
+def encode_value(name, n):
+    size = PARAMS[name][2]
+    if size == 1:
+        return bytes([n])
+    return bytes((n >> (4 * (size - 1 - i))) & 0x0F for i in range(size))
+
+def snapshot(serial, params=SNAPSHOT_PARAMS, inquiry_depth=4, rate=None):
+    """ Read `params` with back-to-back inquiries. Parameters the camera does not answer stay None. """
+    engine = ViscaEngine(serial, rate=rate or ViscaRateController(), inquiry_depth=inquiry_depth)
+    results = engine.run([inquiry_command(name) for name in params])
+    snap = CameraSnapshot()
+    observe = getattr(serial, "observe", None)      # keep a ShadowState in sync
+    for name, res in zip(params, results):
+        if observe:
+            observe(res.cmd, res.reply)
+        answer = next((r for r in parse_replies(res.reply) if r.kind == COMPLETION), None)
+        if res.ok and answer is not None and len(answer.payload) == PARAMS[name][2]:
+            setattr(snap, name, decode_value(name, answer.payload))
+    if snap.version:
+        snap.brand = brand_from_version(snap.version)
+    return snap
+
+MODE_PARAMS = ("monitoring_mode", "lvds_mode")     # video mode setters, applied by a camera reset
+
+def restore_params(snap, include_mode=False):
+    """ Names of the parameters restore_commands() sets, in order. """
+    names = ["ae_mode", "wb_mode", "focus_mode", "zoom"]
+    if snap.focus_mode == FOCUS_MANUAL:
+        names.append("focus")
+    if snap.ae_mode in (AE_MANUAL, AE_IRIS_PRIO):
+        names.append("iris")
+    if snap.ae_mode in (AE_MANUAL, AE_SHUTTER_PRIO):
+        names.append("shutter")
+    if snap.ae_mode == AE_MANUAL:
+        names.append("gain")
+    if include_mode:
+        names += MODE_PARAMS
+    return [n for n in names if getattr(snap, n) is not None]
+
+def restore_commands(snap, include_mode=False):
+    """ Setter commands that bring a camera to `snap`: modes first, then the values those modes let through. """
+    return [setter_command(n, encode_value(n, getattr(snap, n))) for n in restore_params(snap, include_mode)]
+
+def restore(serial, snap, include_mode=False, rate=None):
+    """ Apply `snap` to a camera; with include_mode the video mode is restored and applied with a camera reset. """
+    engine = ViscaEngine(serial, rate=rate or ViscaRateController())
+    names = restore_params(snap, include_mode)
+    results = engine.run(restore_commands(snap, include_mode))
+    modes = [i for i, n in enumerate(names) if n in MODE_PARAMS]
+    if any(results[i].ok for i in modes):
+        results.append(engine.execute(bytes.fromhex("8101041903FF"), until=ACK))
+    observe = getattr(serial, "observe", None)
+    if observe:
+        for res in results:
+            observe(res.cmd, res.reply)
+    return results
+
+def main():
+    from vdlg_lvds.serial import open_serial
+    lvds_devs = glob.glob("/dev/links/lvds*")
+    default_lvds = lvds_devs[0] if lvds_devs else "/dev/v4l-subdev1"
+    parser = argparse.ArgumentParser(description="Save or restore the full VISCA state of a camera")
+    parser.add_argument("-d", "--dev", type=str, default=default_lvds, help="Device path")
+    parser.add_argument("-r", "--restore", type=argparse.FileType("r"), default=None, help="JSON snapshot to apply")
+    parser.add_argument("-m", "--mode", action="store_true", help="also restore the video mode (resets the camera)")
+    args = parser.parse_args()
+
+    with open_serial(args.dev) as ser:
+        if args.restore:
+            for res in restore(ser, CameraSnapshot.from_dict(json.load(args.restore)), args.mode):
+                print(f"cmd: {res.cmd.hex().upper()}, res: {res.reply.hex()}{'' if res.ok else ' FAILED'}")
+        else:
+            print(json.dumps(snapshot(ser).to_dict(), indent=1))
+
+if __name__ == "__main__":
+    main()
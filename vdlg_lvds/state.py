@@ -0,0 +1,124 @@
+#! /usr/bin/env python3
+# SPDX-License-Identifier: GPL-2.0
+#
+# Shadow model of a camera's VISCA state, answering inquiries from cache while fresh.
+#
+
+import threading
+from time import monotonic
+from vdlg_lvds.visca import *
+
+class ShadowState():
+    """
+    Per device cache of the PARAMS values. It is filled by inquiry answers, updated by decoding the
+    setter commands that complete, and invalidated on errors, on commands that move a parameter
+    (zoom/focus/... drive, AE mode change, camera reset) and after `ttl` seconds (`ttls` per name,
+    None = until invalidated; the version never changes).
+
+    Used as a serial proxy, ShadowState(serial).transceive() answers fresh inquiries without
+    touching the link. Without a serial, lookup()/observe() let another transport use the cache.
+    """
+    def __init__(self, serial=None, ttl=2.0, ttls=None):
+        self.serial = serial
+        self.ttl = ttl
+        self.ttls = {"version": None}
+        self.ttls.update(ttls or {})
+        self.values = {}            # name -> (value, time)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def __getattr__(self, attr):
+        # everything else (send, recv, lock, close...) goes straight to the serial device
+        if self.serial is None:
+            raise AttributeError(attr)
+        return getattr(self.serial, attr)
+
+    def get(self, name, max_age=None):
+        """ Cached value of `name` if fresh, else None. """
+        with self._lock:
+            entry = self.values.get(name)
+        if entry is None:
+            return None
+        ttl = self.ttls.get(name, self.ttl) if max_age is None else max_age
+        if ttl is not None and monotonic() - entry[1] > ttl:
+            return None
+        return entry[0]
+
+    def put(self, name, value):
+        with self._lock:
+            self.values[name] = (bytes(value), monotonic())
+
+    def invalidate(self, *names):
+        with self._lock:
+            if not names:
+                version = self.values.get("version")
+                self.values.clear()
+                if version:
+                    self.values["version"] = version
+            for name in names:
+                self.values.pop(name, None)
+
+    def lookup(self, cmd, max_age=None):
+        """ Reply to inquiry `cmd` from cache (y0 50 <value> FF), or None when it has to go to the camera. """
+        name = inquiry_param(cmd)
+        if name is None:
+            return None
+        value = self.get(name, max_age)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return reply_header(cmd) + b"\x50" + value + b"\xff"
+
+    def observe(self, cmd, reply):
+        """ Update the model from a command and the reply the camera gave to it. """
+        cmd = bytes(cmd)
+        replies = parse_replies(reply)
+        failed = any(r.kind == ERROR for r in replies)
+        completed = any(r.kind == COMPLETION for r in replies)
+        name = inquiry_param(cmd)
+        if name is not None:
+            answer = next((r for r in replies if r.kind == COMPLETION), None)
+            if answer is not None and len(answer.payload) == PARAMS[name][2]:
+                self.put(name, answer.payload)
+            else:
+                self.invalidate(name)
+            return
+        if len(cmd) < 4 or cmd[1] != 0x01:
+            return
+        if cmd[2:4] == b"\x04\x19":
+            self.invalidate()           # camera / lens reset
+            return
+        setter = decode_setter(cmd)
+        if setter is not None:
+            name, value = setter
+            self.invalidate(*SIDE_EFFECTS.get(name, ()))
+            if value is not None and completed and not failed:
+                self.put(name, value)
+            else:
+                self.invalidate(name)
+            return
+        axis = command_axis(cmd)
+        if axis in PARAMS:
+            self.invalidate(axis)
+
+    def transceive(self, data: bytes, count:int=0, start_wait_ms=None, stop_wait_ms=None, frame=None):
+        cached = self.lookup(data)
+        if cached is not None:
+            return cached[:count] if count else cached
+        reply = self.serial.transceive(data, count, start_wait_ms, stop_wait_ms, frame)
+        self.observe(data, reply)
+        return reply
+
+    def inquire(self, name, max_age=None, address=1):
+        """ Value of `name`, from cache when fresh, else asked from the camera. None if it did not answer. """
+        value = self.get(name, max_age)
+        if value is None:
+            self.misses += 1
+            cmd = inquiry_command(name, address)
+            self.observe(cmd, self.serial.transceive(cmd, frame=ViscaFrame()))
+            value = self.get(name, float("inf"))
+        else:
+            self.hits += 1
+        return value
@@ -0,0 +1,35 @@
+#! /usr/bin/env python3
+# SPDX-License-Identifier: GPL-2.0
+#
+# Small JSON persistence helpers for learned per-device / per-camera settings.
+#
+
+import json
+import os
+import tempfile
+
+CACHE_DIR = os.environ.get("VDLG_LVDS_CACHE", os.path.join(os.environ.get("XDG_CACHE_HOME", "~/.cache"), "vdlg_lvds"))
+
+def cache_path(name):
+    return os.path.join(os.path.expanduser(CACHE_DIR), name)
+
+def load_json(path, default=None):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+def save_json(path, data):
+    # write-then-rename, so a crash never leaves a truncated file behind. The temp file is unique per
+    # call: threads of one process saving at once must not share it.
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f, indent=1, sort_keys=True)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
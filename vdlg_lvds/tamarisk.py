@@ -1,30 +1,93 @@
-from vdlg_lvds.serial import LvdsSerial
+from vdlg_lvds.serial import open_serial
+from vdlg_lvds.baud import BaudNegotiator, baud_key
+from collections import deque
+from time import monotonic, sleep
 import struct
 import argparse
 import sys
 
 START_BYTE = 0x01
 MTU = 252
+MODEL = "tamarisk"          # camera model in the baud cache key
+
+def checksum(command_id, params):
+    # two's complement of START_BYTE + id + len + params; sum() over the bytes runs in C
+    return -(START_BYTE + command_id + len(params) + sum(params)) & 0xFF
+
+class TamariskDecoder():
+    """
+    Incremental frame decoder: feed() takes RX bytes in chunks of any size and returns the
+    (id, payload) frames they complete. Noise before START_BYTE is skipped; a frame with a bad
+    checksum costs one byte and decoding resyncs on the next START_BYTE.
+    """
+    def __init__(self):
+        self.buf = bytearray()
+        self.skipped = 0
+        self.bad = 0
+
+    def clear(self):
+        self.buf.clear()
+
+    def feed(self, data):
+        self.buf += data
+        frames = []
+        buf = self.buf
+        while True:
+            start = buf.find(START_BYTE)
+            if start < 0:
+                self.skipped += len(buf)
+                buf.clear()
+                break
+            if start:
+                self.skipped += start
+                del buf[:start]
+            if len(buf) < 4:
+                break
+            end = 4 + buf[2]
+            if len(buf) < end:
+                break
+            if checksum(buf[1], buf[3:end - 1]) == buf[end - 1]:
+                frames.append((buf[1], bytes(buf[3:end - 1])))
+                del buf[:end]
+            else:
+                self.bad += 1
+                del buf[:1]
+        return frames
+
+class TamariskFrame():
+    """ transceive() frame detector: complete once START_BYTE + id + len + payload + checksum is in. """
+    def __call__(self, buf):
+        start = buf.find(START_BYTE)
+        while start >= 0:
+            if len(buf) - start < 4:
+                return False
+            end = start + 4 + buf[start + 2]
+            if len(buf) >= end and checksum(buf[start + 1], buf[start + 3:end - 1]) == buf[end - 1]:
+                return True
+            if len(buf) < end:
+                return False
+            start = buf.find(START_BYTE, start + 1)
+        return False
 
 class Tamarisk:
-    def __init__(self, device=None, baudrate=57600):
-        # LvdsSerial uses IOCTLs, baudrate sets the FPGA bridge UART speed
+    def __init__(self, device=None, baudrate=57600, timeout=0.5, resume=True):
+        # LvdsSerial uses IOCTLs (or the bridge TTY node when present), baudrate sets the FPGA bridge UART speed
         # ignore serial if dev is None
+        self.timeout = timeout
+        self.decoder = TamariskDecoder()
+        self.pending = deque()      # decoded frames not yet returned, e.g. a second frame in one read
+        self.device = device
         if device:
-            self.serial = LvdsSerial(device, baud=baudrate)
+            self.serial = open_serial(device, baud=baudrate)
+            if resume:
+                self.resume_baud(baudrate)
 
     def _checksum(self, command_id, params):
-        checksum = -START_BYTE
-        checksum -= command_id
-        checksum -= len(params)
-        for b in params:
-            checksum -= b
-        return checksum & 0xFF
+        return checksum(command_id, params)
 
     def _verify_crc(self, msg_bytes):
-        body = msg_bytes[:-1]
         expected_crc = msg_bytes[-1]
-        calculated = self._checksum(body[1], body[3:-1])
+        calculated = self._checksum(msg_bytes[1], msg_bytes[3:-1])
         return expected_crc == calculated
 
     def _build_msg(self, command_id, params=b''):
@@ -40,44 +103,38 @@ class Tamarisk:
         msg_to_send = self._build_msg(command_id, params)
 
         if expect_response:
-            # Use transceive to send and then wait for/read the response
-            # Setting count=0 reads all available data after the wait period in transceive.
-            raw_response = self.serial.transceive(msg_to_send, count=0)
-
-            if not raw_response:
+            # The frame detector returns as soon as a whole reply is in; split replies are completed
+            # by further reads, extra frames in the same read stay in self.pending.
+            self.decoder.clear()
+            self.pending.clear()
+            self.pending.extend(self.decoder.feed(self.serial.transceive(msg_to_send, count=0, frame=TamariskFrame())))
+            frame = self.read_frame(self.timeout)
+            if frame is None:
                 raise TimeoutError("No response received from Tamarisk")
-
-            # Basic validation: check start byte and minimum length (header + checksum)
-            if len(raw_response) < 4 or raw_response[0] != START_BYTE:
-                 # Attempt to read again with a small delay? Or just fail?
-                 # Let's try one more time after a short sleep, maybe the buffer wasn't stable
-                 import time
-                 time.sleep(0.05)
-                 raw_response = self.serial.recv() # Read any remaining data
-                 if not raw_response or len(raw_response) < 4 or raw_response[0] != START_BYTE:
-                    raise ValueError(f"Invalid or incomplete response received: {raw_response.hex()}")
-
-            # Verify CRC on the received message
-            if not self._verify_crc(raw_response):
-                raise ValueError(f"Checksum mismatch in response: {raw_response.hex()}")
-
-            # Extract response ID and payload
-            # Response format: START_BYTE, response_id, length, payload..., checksum
-            response_id = raw_response[1]
-            length = raw_response[2]
-            payload = raw_response[3:-1]
-
-            # Validate payload length
-            if len(payload) != length:
-                raise ValueError(f"Response length mismatch: expected {length}, got {len(payload)}")
-
-            return response_id, payload
+            return frame
         else:
             # Just send the command, don't wait for or read any response
             self.serial.send(msg_to_send)
             # Optionally clear RX buffer if needed after sending, though maybe not necessary
             # self.serial.recv()
             return None
+    def read_frames(self):
+        """ Decode whatever RX data is available (also from a running rx reader) and return all queued frames. """
+        self.pending.extend(self.decoder.feed(self.serial.recv()))
+        frames = list(self.pending)
+        self.pending.clear()
+        return frames
+
+    def read_frame(self, timeout=0):
+        """ Next (id, payload) frame, reading for up to `timeout` s; None if none completes in time. """
+        end = monotonic() + timeout
+        while not self.pending:
+            self.pending.extend(self.decoder.feed(self.serial.recv()))
+            if self.pending or monotonic() >= end:
+                break
+            sleep(0.002)
+        return self.pending.popleft() if self.pending else None
+
     # Command methods
     def get_system_version(self):
         return self.send_command(0x07)
@@ -108,6 +165,32 @@ class Tamarisk:
         self.send_command(0xF1, struct.pack(">H", baud_id), expect_response=False)
         # Optionally, update self.serial.baud if LvdsSerial allowed dynamic changes, but it doesn't seem to.
 
+    def _negotiator(self, key=None):
+        return BaudNegotiator(self.serial, verify=lambda serial: self.get_system_version() is not None,
+                              key=key or baud_key(self.device, MODEL))
+
+    def resume_baud(self, default=57600, key=None):
+        """
+        Retune the bridge to the rate negotiated in an earlier session, if the camera answers there.
+        Without a cached rate the bridge stays at `default` and nothing is sent. Returns the rate in use.
+        """
+        negotiator = self._negotiator(key)
+        if not any(rate != default for rate in negotiator.cached()):
+            return default
+        try:
+            return negotiator.resume(default, rates=())
+        except RuntimeError:
+            return self.serial.baud     # camera silent: left at `default`
+
+    def negotiate_baud(self, baud_ids, key=None):
+        """
+        Move camera and bridge to the fastest rate in `baud_ids` (rate -> camera baud ID of
+        set_baudrate) that answers get_system_version, falling back to slower ones. The rate is
+        cached per bridge and camera model for resume_baud(). Returns the rate.
+        """
+        return self._negotiator(key).negotiate(lambda rate: self.set_baudrate(baud_ids[rate]),
+                                               rates=[*baud_ids, self.serial.baud])
+
     def get_system_status(self):
         return self.send_command(0xF2)
 
@@ -0,0 +1,119 @@
+#! /usr/bin/env python3
+# SPDX-License-Identifier: GPL-2.0
+#
+# LVDS video-timing telemetry: samples the FPGA timing and status registers of every bridge at a
+# fixed rate over one persistent handle per device (one bulk register read per sample), keeps the last samples in a ring per device
+# and derives rolling statistics (frame-period jitter, dropouts, geometry changes).
+#
+
+from collections import deque, namedtuple
+from time import monotonic, sleep, time
+import json
+import statistics
+from vdlg_lvds.regmap import RegisterMap, REGISTERS, REG_END
+
+# t: wall clock, status: CROSSLINK_REG_LVDS_STATUS
+Sample = namedtuple("Sample", "t cols lines period_us px_mhz status")
+STATUS_LOCK = 0x01      # the status bit the driver waits for before streaming
+TIMING_START = REGISTERS["line_count"].address      # line_count .. px_mhz, in one transfer
+
+def is_dropout(sample):
+    return not (sample.cols and sample.lines and sample.period_us) or not sample.status & STATUS_LOCK
+
+class TelemetrySampler():
+    """ Samples `devs` every 1/`rate_hz` s; the last `size` samples of each device are kept. """
+    def __init__(self, devs, rate_hz=50, size=1024):
+        self.rate_hz = rate_hz
+        self.devices = {dev: RegisterMap(dev) for dev in devs}
+        self.samples = {dev: deque(maxlen=size) for dev in devs}
+        self.errors = {dev: 0 for dev in devs}
+
+    def close(self):
+        for d in self.devices.values():
+            d.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def read(self, dev):
+        regs = self.devices[dev]
+        regs.read(TIMING_START, REG_END - TIMING_START)
+        return Sample(time(), regs["colm_count"], regs["line_count"], regs["frame_period"], regs["px_mhz"],
+                      regs["lvds_status"])
+
+    def poll(self):
+        """ One sample of every device. Returns {dev: Sample}; unreadable devices are counted and skipped. """
+        taken = {}
+        for dev in self.devices:
+            try:
+                taken[dev] = self.read(dev)
+            except OSError:
+                self.errors[dev] += 1
+                continue
+            self.samples[dev].append(taken[dev])
+        return taken
+
+    def run(self, callback=None, count=None, stop=None):
+        """
+        Poll at `rate_hz` against absolute deadlines (no drift, the thread sleeps between rounds)
+        until `count` rounds are done or `stop` (threading.Event) is set. `callback(taken)` runs per round.
+        """
+        period = 1 / self.rate_hz
+        deadline = monotonic()
+        rounds = 0
+        while (count is None or rounds < count) and not (stop and stop.is_set()):
+            taken = self.poll()
+            if callback:
+                callback(taken)
+            rounds += 1
+            deadline += period
+            delay = deadline - monotonic()
+            if delay > 0:
+                sleep(delay)
+            else:
+                deadline = monotonic()      # fell behind: skip the missed slots instead of bursting
+
+    def stats(self, dev):
+        """ Rolling statistics over the samples in the ring of `dev`. """
+        ring = list(self.samples[dev])
+        periods = [s.period_us for s in ring if not is_dropout(s)]
+        geometry = [(s.cols, s.lines) for s in ring if not is_dropout(s)]
+        last = ring[-1] if ring else None
+        return {
+            "samples": len(ring),
+            "errors": self.errors[dev],
+            "dropouts": sum(is_dropout(s) for s in ring),
+            "geometry_changes": sum(a != b for a, b in zip(geometry, geometry[1:])),
+            "period_us": statistics.mean(periods) if periods else None,
+            "jitter_us": statistics.pstdev(periods) if len(periods) > 1 else None,
+            "jitter_pp_us": max(periods) - min(periods) if periods else None,
+            "last": last._asdict() if last else None,
+        }
+
+def watch(sampler, out, interval=1.0, stop=None, count=None):
+    """
+    JSON lines on `out`: a "sample" line whenever geometry, pixel clock, status or dropout state of
+    a device changes, and a "stats" line per device every `interval` s. Nothing is formatted in between.
+    """
+    previous = {}
+    next_stats = monotonic() + interval
+
+    def on_round(taken):
+        nonlocal next_stats
+        lines = []
+        for dev, s in taken.items():
+            key = (s.cols, s.lines, s.px_mhz, s.status, is_dropout(s))
+            if previous.get(dev) != key:
+                previous[dev] = key
+                lines.append({"type": "sample", "dev": dev, **s._asdict()})
+        if monotonic() >= next_stats:
+            next_stats += interval
+            lines += [{"type": "stats", "dev": dev, **sampler.stats(dev)} for dev in sampler.devices]
+        if lines:
+            out.write("".join(json.dumps(line) + "\n" for line in lines))
+            out.flush()
+
+    sampler.run(on_round, count=count, stop=stop)
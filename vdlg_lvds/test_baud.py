@@ -0,0 +1,58 @@
+import os
+from .baud import *
+from . import store
+
+def test_baud_negotiation(tmp_path):
+    class Link:
+        """ Camera that switches to every rate but 115200; it answers only when both ends agree. """
+        def __init__(self):
+            self.baud = self.camera = 9600
+        def set_baud(self, baud):
+            self.baud = baud
+        def recv(self, count=0):
+            return b""
+        def switch(self, rate):
+            if self.baud == self.camera and rate != 115200:
+                self.camera = rate
+    link = Link()
+    cache = str(tmp_path / "baud.json")
+    neg = BaudNegotiator(link, verify=lambda s: s.baud == s.camera, key="cam0", path=cache, settle_ms=0)
+    assert neg.negotiate(link.switch, rates=[115200, 57600, 9600]) == 57600
+    assert link.camera == link.baud == 57600
+    link.baud = 9600    # new session
+    assert BaudNegotiator(link, verify=lambda s: s.baud == s.camera, key="cam0", path=cache, settle_ms=0).resume() == 57600
+    assert link.baud == 57600
+
+def test_baud_cache_keys(tmp_path):
+    class Link:
+        baud = 9600
+        def set_baud(self, baud):
+            self.baud = baud
+        def recv(self, count=0):
+            return b""
+    cache = str(tmp_path / "baud.json")
+    BaudNegotiator(Link(), key=baud_key("/dev/null", "sony_ev95xx"), path=cache).save(38400)
+    assert BaudNegotiator(Link(), key=baud_key("/dev/null"), path=cache).cached() == [38400]   # before detection
+    assert BaudNegotiator(Link(), key=baud_key("/dev/null", "tamron"), path=cache).cached() == []
+    assert baud_key("/dev/null", "tamarisk") == os.path.realpath("/dev/null") + ":tamarisk"
+
+def test_tamarisk_resumes_cached_rate(bridge, tmp_path, monkeypatch):
+    from .tamarisk import Tamarisk
+    monkeypatch.setattr(store, "CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(Tamarisk, "get_system_version", lambda self: (0x07, b"") if bridge.baud == 115200 else None)
+    assert Tamarisk("/dev/null").serial.baud == 57600       # nothing cached: no probing
+    with open(tmp_path / "baud.json", "w") as f:
+        f.write('{"%s": 115200}' % baud_key("/dev/null", "tamarisk"))
+    assert Tamarisk("/dev/null").serial.baud == 115200
+
+def test_parallel_saves_keep_every_camera(tmp_path):
+    import threading
+    cache = str(tmp_path / "baud.json")
+    threads = [threading.Thread(target=BaudNegotiator(None, key=f"cam{n}", path=cache).save, args=(57600,))
+               for n in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert store.load_json(cache) == {f"cam{n}": 57600 for n in range(8)}
+    assert os.listdir(tmp_path) == ["baud.json"]
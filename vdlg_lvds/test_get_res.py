@@ -0,0 +1,9 @@
+from time import monotonic
+from .get_res import *
+
+def test_wait_for_lock(bridge):
+    start = monotonic()
+    bridge.timing = lambda: (1280, 720, 16667) if monotonic() - start > 0.03 else (0, 0, 0)
+    lock = wait_for_lock("/dev/null", "720p60", stable=0.02)
+    assert 0.03 <= lock < 0.1
+    assert wait_for_lock("/dev/null", "1080p30", timeout=0.05) is None
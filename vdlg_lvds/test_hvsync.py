@@ -0,0 +1,11 @@
+from .hvsync import *
+
+def test_hvsync_detection(bridge, tmp_path):
+    bridge.timing = lambda: (1280, 720, 16667) if bridge.regs[0x3] == HVSYNC_INVERT else (1280, 0, 0)
+    cache = str(tmp_path / "hvsync.json")
+    kw = dict(path=cache, settle_s=0, stable=0.01, timeout=0.05)
+    assert detect_polarity("/dev/null", "0020:0711", **kw) == HVSYNC_INVERT
+    bridge.regs[0x3] = 0
+    calls = bridge.calls
+    assert detect_polarity("/dev/null", "0020:0711", **kw) == HVSYNC_INVERT
+    assert bridge.calls == calls + 1 and bridge.regs[0x3] == HVSYNC_INVERT     # cached: no probing
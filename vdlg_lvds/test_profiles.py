@@ -0,0 +1,32 @@
+import json
+from .profiles import *
+
+def test_profile_lookup(tmp_path):
+    db = ProfileDB()
+    assert db.lookup("905000200711000203ff").name == "sony_ev95xx"
+    assert db.lookup(bytes.fromhex("0023f017000102")).name == "tamron"
+    assert db.lookup("905000990711000203ff") is None
+    assert db.get("videology").modes["720p60"][-1] == Step(bytes.fromhex("81010424740000FF"), False, None)
+    (tmp_path / "ev7520.json").write_text(json.dumps({"name": "ev7520a", "vendor": "0020", "models": ["0640"],
+        "apply": [{"cmd": "8101041903FF", "wait_ms": 4000}], "modes": {"720p60": ["8101042472000AFF"]}}))
+    db = ProfileDB(profile_dir=str(tmp_path))
+    assert db.lookup("00200640010203").name == "ev7520a"
+    assert db.lookup("00200641010203").name == "sony_ev75xx"
+    assert db.get("ev7520a").modes["720p60"][1] == Step(b"\x81\x01\x04\x19\x03\xff", True, 4000)
+
+def test_mixed_case_file_profile(tmp_path, monkeypatch):
+    from . import profiles, set_res
+    from .test_visca import FakeCamera
+    class Camera(FakeCamera):
+        def transceive(self, data, frame=None):
+            self.sent.append(bytes(data))
+            return bytes.fromhex("905000420101010203ff" if data[1:3] == b"\x09\x00" else "905002ff")
+    (tmp_path / "acme.json").write_text(json.dumps({"name": "Acme_X", "vendor": "0042", "models": ["0101"],
+        "modes": {"720p60": ["8101042472000AFF"]}}))
+    monkeypatch.setattr(profiles, "_default", ProfileDB(profile_dir=str(tmp_path)))
+    cam = Camera(exec_ms=1)
+    brand = set_res.detect_camera_brand(cam)
+    assert brand == "acme_x"
+    set_res.set_resolution(cam, "720p60", brand, force=True)
+    set_res.set_resolution(cam, "720p60", "Acme_X", force=True)
+    assert cam.sent.count(bytes.fromhex("8101042472000aff")) == 2
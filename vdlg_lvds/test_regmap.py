@@ -0,0 +1,14 @@
+from .regmap import *
+
+def test_register_map(bridge):
+    with RegisterMap("/dev/null") as regs:
+        state = regs.capture()
+        assert regs.ioctls == 1
+        assert (state["id"], state["colm_count"], state["line_count"], state["uart_prescl"]) == (7, 1920, 1080, 2500)
+        bridge.regs[0x2] = 0xFE                             # the driver started streaming meanwhile
+        assert regs.apply({"lvds_inv": 2, "uart_prescl": 2500}) == 1
+        assert bridge.writes == [bytes([0x1, 0xFE, 0x2])]   # from the read-only ID register on, ENABLE kept
+        assert regs.ioctls == 4                             # fresh read of ENABLE, write, read back
+        assert regs.apply({"lvds_inv": 2}) == 0
+        assert regs.restore(state) == 1 and regs.ioctls == 5
+        assert bridge.regs[0x2] == 0 and bridge.regs[0x3] == 0
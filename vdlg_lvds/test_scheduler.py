@@ -0,0 +1,42 @@
+import threading
+from .scheduler import *
+
+class SlowSerial:
+    def __init__(self):
+        self.sent = []
+        self.gate = threading.Event()
+        self.busy = threading.Event()
+
+    def transceive(self, data, **kwargs):
+        self.busy.set()
+        self.gate.wait(1)
+        self.sent.append(data)
+        return b"\x90\x50\xff"
+
+def test_priority_and_supersede():
+    ser = SlowSerial()
+    with CommandScheduler(ser, rates={BACKGROUND: None}) as sched:
+        first = sched.submit(b"\x01", BACKGROUND, key="busy")     # occupies the worker
+        ser.busy.wait(1)
+        polls = [sched.submit(b"\x81\x09\x04\x47\xff", BACKGROUND) for _ in range(3)]
+        ctrl = sched.submit(b"\x81\x01\x04\x07\x02\xff")                # INTERACTIVE by default
+        ser.gate.set()
+        assert ctrl.result(1) == b"\x90\x50\xff"
+        assert polls[2].result(1) == b"\x90\x50\xff"
+        assert polls[0].cancelled() and polls[1].cancelled()
+        first.result(1)
+    assert ser.sent[1] == b"\x81\x01\x04\x07\x02\xff"
+    assert sched.stats[BACKGROUND]["superseded"] == 2
+
+def test_coalescing():
+    ser = SlowSerial()
+    with CoalescingQueue(ser) as queue:
+        queue.submit(b"\x81\x01\x04\x19\x03\xff")                   # not an axis command
+        ser.busy.wait(1)
+        zooms = [queue.submit(bytes([0x81, 0x01, 0x04, 0x07, 0x20 + n, 0xff])) for n in range(5)]
+        focus = queue.submit(b"\x81\x01\x04\x08\x02\xff")
+        ser.gate.set()
+        focus.result(1)
+        zooms[-1].result(1)
+    assert all(z.cancelled() for z in zooms[:-1])
+    assert ser.sent[1:] == [bytes([0x81, 0x01, 0x04, 0x07, 0x24, 0xff]), b"\x81\x01\x04\x08\x02\xff"]
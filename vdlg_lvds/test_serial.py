@@ -0,0 +1,208 @@
+import os
+import pytest
+from . import ioctl as ioctl_mod
+from .ioctl import *
+from .serial import LvdsSerial
+from .visca import ViscaFrame
+from time import monotonic
+
+def test_single_handle(bridge, monkeypatch):
+    opened = []
+    real_open = ioctl_mod.os.open
+    monkeypatch.setattr(ioctl_mod.os, "open", lambda *a: opened.append(a) or real_open(*a))
+    with LvdsSerial("/dev/null", baud=57600) as ser:
+        bridge.rx += b"\x90\x50\xff"
+        assert ser.get_rx_count() == 3
+        assert ser.recv() == b"\x90\x50\xff"
+        ser.send(b"\x81\x09\x00\x02\xff")
+        assert ser.get_baud() == 57600
+    assert len(opened) == 1
+    assert ser.fd is None
+    assert bytes(bridge.tx) == b"\x81\x09\x00\x02\xff"
+
+def test_reopen_on_lost_device(bridge):
+    ser = LvdsSerial("/dev/null")
+    os.close(ser.fd)    # device went away behind our back
+    bridge.rx += b"\x01"
+    assert ser.recv() == b"\x01"
+    ser.close()
+
+def test_transceive_completes_on_frame(bridge):
+    bridge.replies[bytes.fromhex("81090002ff")] = bytes.fromhex("9050002006400000ff")
+    with LvdsSerial("/dev/null", stop_wait_ms=500) as ser:
+        t = monotonic()
+        assert ser.transceive(bytes.fromhex("81090002ff"), frame=ViscaFrame()).hex() == "9050002006400000ff"
+        assert monotonic() - t < 0.4
+
+def test_async_transceive(bridge):
+    import asyncio
+    from .aio import AsyncLvdsSerial
+    bridge.replies[bytes.fromhex("81090002ff")] = bytes.fromhex("9050002006400000ff")
+
+    async def run():
+        async with AsyncLvdsSerial("/dev/null") as ser:
+            replies = await asyncio.gather(*[ser.transceive(bytes.fromhex("81090002ff"), frame=ViscaFrame()) for _ in range(3)])
+            assert all(r.hex() == "9050002006400000ff" for r in replies)
+            # reply still trickling in when the timeout fires: the fifo is left clean
+            bridge.replies[b"\x81\x01\xff"] = b"\x90\x41"
+            try:
+                await ser.transceive(b"\x81\x01\xff", start_wait_ms=1000, stop_wait_ms=1000, timeout=0.05)
+            except asyncio.TimeoutError:
+                pass
+            else:
+                assert False, "expected timeout"
+            assert bridge.rx == b"" and ser.serial.get_rx_count() == 0
+            assert not ser.serial.lock.locked()
+    asyncio.run(run())
+
+def test_tty_backend():
+    import asyncio
+    from .serial import LvdsTtySerial, open_serial, tty_for
+    assert tty_for("/dev/ttyVISCA1") == "/dev/ttyVISCA1"
+    master, slave = os.openpty()
+    try:
+        with LvdsTtySerial(os.ttyname(slave), stop_wait_ms=300, baud=57600) as ser:
+            assert ser.get_baud() == 57600
+            os.write(master, bytes.fromhex("9041ff9051ff"))
+            t = monotonic()
+            reply = ser.wait_for_reply(ViscaFrame(), 100, 300)
+            assert reply.hex() == "9041ff9051ff"
+            assert monotonic() - t < 0.2
+            ser.send(b"\x81\x09\x00\x02\xff")
+            assert os.read(master, 16) == b"\x81\x09\x00\x02\xff"
+
+            async def run():
+                from .aio import AsyncLvdsSerial
+                loop = asyncio.get_running_loop()
+                loop.call_later(0.02, os.write, master, bytes.fromhex("9050ff"))
+                t = monotonic()
+                reply = await AsyncLvdsSerial(ser.dev, serial=ser).wait_for_reply(ViscaFrame(), 500, 300)
+                assert reply.hex() == "9050ff" and monotonic() - t < 0.1
+            asyncio.run(run())
+    finally:
+        os.close(master)
+        os.close(slave)
+
+def test_tty_resolved_through_sysfs(bridge, tmp_path, monkeypatch):
+    from . import serial as serial_mod
+    of_node = tmp_path / "v4l-subdev3" / "device" / "of_node"
+    of_node.mkdir(parents=True)
+    (of_node / "csi_id").write_bytes((2).to_bytes(4, "big"))      # not the link suffix
+    monkeypatch.setattr(serial_mod, "SYSFS_V4L", str(tmp_path))
+    assert serial_mod.tty_for("/dev/v4l-subdev3") == "/dev/ttyVISCA2"
+    assert serial_mod.tty_for("/dev/v4l-subdev1") is None
+    assert serial_mod.ctrl_for("/dev/ttyVISCA2") == "/dev/v4l-subdev3"
+    assert serial_mod.ctrl_for("/dev/ttyVISCA0") is None
+    master, slave = os.openpty()
+    try:
+        with serial_mod.LvdsTtySerial(os.ttyname(slave), ctrl="/dev/null") as ser:
+            assert ser.get_uart_status()[2]         # TX empty, read through the sub-device node
+            assert ser.start_rx_reader() is None
+    finally:
+        os.close(master)
+        os.close(slave)
+
+def test_daemon_roundtrip(bridge, tmp_path):
+    import asyncio
+    from .daemon import LvdsDaemon, RemoteSerial, DaemonClient
+    bridge.replies[bytes.fromhex("81090002ff")] = bytes.fromhex("9050002006400000ff")
+    bridge.replies[bytes.fromhex("81090447ff")] = bytes.fromhex("905001020304ff")
+    path = str(tmp_path / "lvds.sock")
+
+    def client():
+        with RemoteSerial("/dev/null", DaemonClient(path)) as ser:
+            for _ in range(3):
+                assert ser.transceive(bytes.fromhex("81090002ff"), frame=ViscaFrame()).hex() == "9050002006400000ff"
+            with pytest.raises(RuntimeError):
+                ser.client.request(op="bogus", dev="/dev/null")
+            zoom = bytes.fromhex("81090447ff")
+            ser.transceive(zoom, frame=ViscaFrame())
+            ser.transceive(zoom, frame=ViscaFrame())
+            ser.send(bytes.fromhex("8101044702ff"))       # raw frame: the cached zoom may be stale now
+            ser.transceive(zoom, frame=ViscaFrame())
+            cache = ser.client.request(op="ping")["cache"][os.path.realpath("/dev/null")]
+            assert cache == {"hits": 1, "misses": 3 + 2}  # 3 version inquiries, zoom before and after the send
+
+    async def run():
+        server = await LvdsDaemon().start(path)
+        async with server:
+            await asyncio.get_event_loop().run_in_executor(None, client)
+            with pytest.raises(RuntimeError):
+                await LvdsDaemon().start(path)      # never steal the socket of a live daemon
+    asyncio.run(run())
+
+def test_batch(bridge):
+    import io, json
+    from .serial import run_batch
+    bridge.replies[bytes.fromhex("81090002ff")] = bytes.fromhex("9050002006400000ff")
+    bridge.replies[bytes.fromhex("8101043802ff")] = bytes.fromhex("9041ff9051ff")
+    lines = ["# provisioning", "81090002FF expect=9050", "", "8101043802FF t=50 expect=9050", "zz"]
+    out = io.StringIO()
+    with LvdsSerial("/dev/null") as ser:
+        assert run_batch(ser, lines, out, ViscaFrame()) == 2
+    recs = [json.loads(l) for l in out.getvalue().splitlines()]
+    assert [r.get("ok") for r in recs[:-1]] == [True, False, False]
+    assert recs[1]["reply"] == "9041ff9051ff"
+    assert recs[-1]["summary"]["commands"] == 3
+
+    class Failing():
+        def transceive(self, data, **kw):
+            raise RuntimeError("No such device")
+    out = io.StringIO()
+    assert run_batch(Failing(), lines, out) == 3
+    recs = [json.loads(l) for l in out.getvalue().splitlines()]
+    assert recs[0]["error"] == "No such device" and recs[-1]["summary"]["commands"] == 3
+
+def test_adaptive_timing(bridge, tmp_path):
+    from .timing import AdaptiveTiming
+    bridge.replies[bytes.fromhex("81090447ff")] = bytes.fromhex("905001020304ff")
+    timing = AdaptiveTiming(path=str(tmp_path / "timing.json"), min_samples=3)
+    with LvdsSerial("/dev/null", timing=timing) as ser:
+        assert timing.waits(ser.dev, bytes.fromhex("81090447ff")) is None
+        for _ in range(3):
+            ser.transceive(bytes.fromhex("81090447ff"), stop_wait_ms=10)
+        start, stop = timing.waits(ser.dev, bytes.fromhex("81090447ff"))
+        assert start < 100 and stop < 120
+        slow = timing.waits(ser.dev, bytes.fromhex("81090447ff"), baud=9600)
+        assert slow[0] >= 9 * 10 / 9.6 and slow[1] >= 4 * 10 / 9.6 + timing.pad_ms      # byte-time floors
+    timing.save()
+    assert AdaptiveTiming(path=str(tmp_path / "timing.json"), min_samples=3).waits("/dev/null", bytes.fromhex("81090447ff")) == (start, stop)
+    bridge.replies[bytes.fromhex("81090447ff")] = bytes.fromhex("905001")     # cut off: the waits are relearned
+    with LvdsSerial("/dev/null", timing=timing) as ser:
+        ser.transceive(bytes.fromhex("81090447ff"), frame=ViscaFrame())
+    assert timing.waits("/dev/null", bytes.fromhex("81090447ff")) is None
+
+def test_fragmented_send(bridge, monkeypatch):
+    payload = bytes(range(256))
+    writes = []
+    real = bridge.ioctl
+    def ioctl(fd, cmd, buf, *args):
+        if cmd == LVDS_CMD_SERIAL_SEND_TX:
+            writes.append(buf.len)
+        return real(fd, cmd, buf, *args)
+    monkeypatch.setattr(ioctl_mod.fcntl, "ioctl", ioctl)
+    with LvdsSerial("/dev/null", baud=921600) as ser:
+        ser.send(payload)
+        assert bytes(bridge.tx) == payload
+        assert max(writes) <= UART_FIFO_SIZE
+        stats = ser.tx_throughput()
+        assert stats["bytes"] == 256 and stats["chunks"] == len(writes)
+
+def test_rx_ring():
+    from .serial import RxRing
+    ring = RxRing(8)
+    ring.put(b"abcdef")
+    assert ring.read(4) == b"abcd"
+    ring.put(b"ghijklm")          # wraps and drops the oldest byte
+    assert ring.overflow == 1 and ring.high_water == 8
+    assert ring.read() == b"fghijklm"
+    assert ring.read(timeout=0.01) == b""
+
+def test_rx_reader(bridge):
+    with LvdsSerial("/dev/null") as ser:
+        ring = ser.start_rx_reader(rate_hz=1000)
+        bridge.rx += b"\x90\x38\xff"          # unsolicited message
+        assert ring.read(3, timeout=1) == b"\x90\x38\xff"
+        bridge.replies[bytes.fromhex("81090002ff")] = bytes.fromhex("9050002006400000ff")
+        assert ser.transceive(bytes.fromhex("81090002ff"), frame=ViscaFrame()).hex() == "9050002006400000ff"
+    assert ser.rx_ring is None
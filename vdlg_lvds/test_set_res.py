@@ -0,0 +1,31 @@
+def test_provision_all(bridge, monkeypatch, capsys):
+    from . import set_res
+    monkeypatch.setattr(set_res, "detect_camera_brand", lambda ser: "sony_ev75xx")
+    monkeypatch.setattr(set_res, "set_resolution", lambda ser, res, brand, dev=None, force=False: 0.05)
+    results = set_res.provision_all(["/dev/null", "/dev/zero"], "720p60")
+    assert results == {"/dev/null": 0.05, "/dev/zero": 0.05}
+    out = capsys.readouterr().out
+    assert out.count(": done") == 2 and "2 cameras in" in out
+
+def test_needed_commands():
+    from .set_res import needed_commands
+    from .profiles import default_db
+    class Camera:
+        answers = {"8109042472ff": "90500101ff", "8109042474ff": "90500000ff"}
+        def transceive(self, data, frame=None):
+            return bytes.fromhex(self.answers.get(bytes(data).hex(), "906041ff"))
+    modes = default_db().get("sony_ev75xx").modes
+    assert needed_commands(Camera(), modes["720p25"], "720p25") == []
+    assert [s.cmd.hex().upper() for s in needed_commands(Camera(), modes["720p60"], "720p60")] == \
+        ["8101042472000AFF", "8101041903FF"]
+
+def test_set_resolution_without_counters(tmp_path):
+    from .set_res import set_resolution
+    from .test_visca import FakeCamera
+    class Camera(FakeCamera):
+        def transceive(self, data, frame=None):
+            self.sent.append(bytes(data))
+            return bytes.fromhex("905002ff")
+    cam = Camera(exec_ms=1)
+    assert set_resolution(cam, "720p60", "sony_ev75xx", dev=str(tmp_path / "missing"), force=True) is None
+    assert cam.sent[-1] == bytes.fromhex("81090400ff")      # fell back to polling the camera status
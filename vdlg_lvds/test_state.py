@@ -0,0 +1,34 @@
+from .state import ShadowState
+
+class EchoSerial:
+    def __init__(self, replies):
+        self.replies = replies
+        self.sent = []
+
+    def transceive(self, data, count=0, start_wait_ms=None, stop_wait_ms=None, frame=None):
+        self.sent.append(bytes(data).hex())
+        return bytes.fromhex(self.replies.get(bytes(data).hex(), "9041ff9051ff"))
+
+def test_inquiry_cached_and_updated_by_setter():
+    ser = EchoSerial({"81090002ff": "905000200640010203ff", "81090447ff": "905001020304ff"})
+    state = ShadowState(ser)
+    for _ in range(3):
+        assert state.transceive(bytes.fromhex("81090002ff")).hex() == "905000200640010203ff"
+    assert ser.sent.count("81090002ff") == 1
+    assert state.inquire("zoom") == bytes.fromhex("01020304")
+    state.transceive(bytes.fromhex("810104470a0b0c0dff"))        # zoom direct, completes
+    assert state.inquire("zoom") == bytes.fromhex("0a0b0c0d")
+    assert ser.sent.count("81090447ff") == 1
+    state.transceive(bytes.fromhex("8101040702ff"))              # zoom tele: position unknown now
+    assert state.get("zoom") is None
+    state.transceive(bytes.fromhex("8101041903ff"))              # reset keeps only the version
+    assert state.get("version") is not None and state.get("zoom") is None
+
+def test_error_and_ttl_invalidate():
+    ser = EchoSerial({"8101044b00000102ff": "9041ff906141ff", "81090439ff": "905003ff"})
+    state = ShadowState(ser, ttl=0)
+    state.put("iris", b"\x00\x00\x00\x05")
+    state.transceive(bytes.fromhex("8101044b00000102ff"))
+    assert state.get("iris", max_age=10) is None
+    state.inquire("ae_mode")
+    assert state.lookup(bytes.fromhex("81090439ff")) is None     # ttl=0: always stale
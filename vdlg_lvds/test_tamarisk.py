@@ -19,4 +19,41 @@ def test_command_packet():
     assert bytes[1] == 0x07
     assert bytes[2] == 0x00
     assert bytes[3] == 0xF8
-    # Checksum is 0xF8, which is the expected value for this example
\ No newline at end of file
+    # Checksum is 0xF8, which is the expected value for this example
+
+
+def test_frame_detector():
+    from .tamarisk import TamariskFrame
+    reply = Tamarisk()._build_msg(0x07, b'\x01\x02\x03')
+    detect = TamariskFrame()
+    assert not detect(reply[:-1])
+    assert detect(reply)
+    assert detect(b'\x55' + reply)       # leading noise
+
+def test_decoder_split_and_concatenated():
+    from .tamarisk import TamariskDecoder
+    a = Tamarisk()._build_msg(0x07, b'\x01\x02\x03')
+    b = Tamarisk()._build_msg(0xF2, b'\x00\x01')
+    broken = bytearray(a)
+    broken[-1] ^= 0xFF
+    dec = TamariskDecoder()
+    stream = b'\x55' + bytes(broken) + a + b
+    frames = []
+    for i in range(0, len(stream), 3):
+        frames += dec.feed(stream[i:i + 3])
+    assert frames == [(0x07, b'\x01\x02\x03'), (0xF2, b'\x00\x01')]
+    assert dec.bad and not dec.buf     # the bad frame, plus any START_BYTE inside it
+
+def test_send_command_split_reply():
+    class SplitSerial:
+        def __init__(self, reply):
+            self.chunks = [reply[:2], reply[2:5], reply[5:]]
+        def transceive(self, data, count=0, frame=None):
+            return self.chunks.pop(0)
+        def recv(self, count=0):
+            return self.chunks.pop(0) if self.chunks else b''
+    cam = Tamarisk()
+    extra = cam._build_msg(0xF2, b'\x00')
+    cam.serial = SplitSerial(cam._build_msg(0x07, b'\x01\x02\x03') + extra)
+    assert cam.send_command(0x07) == (0x07, b'\x01\x02\x03')
+    assert cam.read_frames() == [(0xF2, b'\x00')]
@@ -0,0 +1,15 @@
+import io
+import json
+from .telemetry import *
+
+def test_telemetry_watch(bridge):
+    periods = iter([16667, 16667, 0, 16660, 16674])
+    bridge.timing = lambda: (1920, 1080, next(periods))
+    out = io.StringIO()
+    with TelemetrySampler(["/dev/null"], rate_hz=1000, size=4) as sampler:
+        watch(sampler, out, interval=0, count=5)
+        stats = sampler.stats("/dev/null")
+    lines = [json.loads(l) for l in out.getvalue().splitlines()]
+    assert [l["period_us"] for l in lines if l["type"] == "sample"] == [16667, 0, 16660]
+    assert stats["samples"] == 4 and stats["dropouts"] == 1 and stats["jitter_pp_us"] == 14
+    assert stats["period_us"] == 16667
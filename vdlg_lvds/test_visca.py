@@ -0,0 +1,132 @@
+from .visca import *
+
+def test_parse_replies():
+    replies = parse_replies(bytes.fromhex("9041ff9051ff906003ff9050"))
+    assert replies == [
+        ViscaReply(ACK, 1, b""),
+        ViscaReply(COMPLETION, 1, b""),
+        ViscaReply(ERROR, 0, b"\x03"),
+    ]
+    assert error_code(replies[2]) == ERR_BUFFER_FULL
+
+def test_visca_frame():
+    assert not ViscaFrame()(bytes.fromhex("9041ff"))
+    assert ViscaFrame()(bytes.fromhex("9041ff9051ff"))
+    assert ViscaFrame(until=ACK)(bytes.fromhex("9041ff"))
+    assert ViscaFrame()(bytes.fromhex("9050002006400000ff"))
+    assert ViscaFrame()(bytes.fromhex("906041ff"))
+    assert not ViscaFrame()(bytes.fromhex("905000"))
+
+def test_command_axis():
+    assert command_axis(bytes.fromhex("8101040702ff")) == "zoom"
+    assert command_axis(bytes.fromhex("810104470102030400ff")) == "zoom"
+    assert command_axis(bytes.fromhex("81010601050503 01ff".replace(" ", ""))) == "pan_tilt"
+    assert command_axis(bytes.fromhex("81090447ff")) is None
+    assert command_axis(bytes.fromhex("8101041903ff")) is None
+
+class FakeCamera:
+    """
+    VISCA camera with two sockets: ACK after 1 ms, completion `exec_ms` later. Inquiries are
+    answered in order, the first one of a command in `slow` ({hex: ms}) after that delay.
+    """
+    def __init__(self, exec_ms=30, errors=(), answers=None, slow=None):
+        from time import monotonic
+        self.answers = answers or {}
+        self.slow = dict(slow or {})
+        self.answered = 0.0
+        self.clock = monotonic
+        self.exec_ms = exec_ms
+        self.errors = list(errors)
+        self.events = []        # (time, bytes)
+        self.busy = {}
+        self.sent = []
+
+    def send(self, data):
+        now = self.clock()
+        self.sent.append(bytes(data))
+        if data[1] == 0x09:
+            self.answered = max(self.answered, now + self.slow.pop(bytes(data).hex(), 1) / 1000)
+            self.events.append((self.answered, bytes.fromhex(self.answers.get(bytes(data).hex(), "90500102ff"))))
+            return
+        if self.errors:
+            self.events.append((now + 0.001, bytes([0x90, 0x60, self.errors.pop(0), 0xff])))
+            return
+        sock = next(s for s in (1, 2) if self.busy.get(s, 0) <= now)
+        self.busy[sock] = now + self.exec_ms / 1000
+        self.events.append((now + 0.001, bytes([0x90, 0x40 | sock, 0xff])))
+        self.events.append((self.busy[sock], bytes([0x90, 0x50 | sock, 0xff])))
+
+    def _due(self):
+        now = self.clock()
+        return [e for e in self.events if e[0] <= now]
+
+    def get_rx_count(self):
+        return sum(len(e[1]) for e in self._due())
+
+    def recv(self, count=0):
+        due = sorted(self._due())
+        for e in due:
+            self.events.remove(e)
+        return b"".join(e[1] for e in due)
+
+def test_engine_pipelines_two_sockets():
+    from time import monotonic
+    cam = FakeCamera(exec_ms=40)
+    cmds = [bytes.fromhex("8101043802ff")] * 4 + [bytes.fromhex("81090447ff")]
+    t = monotonic()
+    results = ViscaEngine(cam).run(cmds)
+    elapsed = monotonic() - t
+    assert all(r.ok for r in results)
+    assert {r.socket for r in results[:4]} == {1, 2}
+    assert results[4].reply.hex() == "90500102ff"
+    assert elapsed < 4 * 0.040       # sequential would need 160 ms
+
+def test_engine_errors():
+    cam = FakeCamera(errors=[ERR_BUFFER_FULL])
+    res = ViscaEngine(cam).run([bytes.fromhex("8101043802ff"), bytes.fromhex("8101043803ff")])
+    assert res[0].error == ERR_BUFFER_FULL and not res[0].ok
+    assert res[1].ok
+
+def test_engine_resyncs_after_inquiry_timeout():
+    cam = FakeCamera(answers={"81090447ff": "905001020304ff", "81090448ff": "905005060708ff", "81090439ff": "905003ff"},
+                     slow={"81090447ff": 40})
+    res = ViscaEngine(cam, ack_timeout_ms=20, inquiry_depth=4).run(
+        [bytes.fromhex("81090447ff"), bytes.fromhex("81090448ff"), bytes.fromhex("81090439ff")])
+    assert not res[0].ok and res[0].reply == b""        # its late answer is dropped, not given to the next one
+    assert res[1].reply.hex() == "905005060708ff" and res[2].reply.hex() == "905003ff"
+    assert len(cam.sent) == 5
+
+def test_rate_controller_backs_off_and_retries():
+    cam = FakeCamera(errors=[ERR_BUFFER_FULL, ERR_BUFFER_FULL])
+    rate = ViscaRateController(backoff_ms=2)
+    res = ViscaEngine(cam, rate=rate).run([bytes.fromhex("8101043802ff")])
+    assert res[0].ok
+    assert len(cam.sent) == 3
+    assert rate.rejected == 2 and rate.ok == 1
+    assert rate.interval > 0
+
+def test_snapshot_roundtrip():
+    from .snapshot import snapshot, restore, restore_commands, CameraSnapshot
+    cam = FakeCamera(answers={
+        "81090002ff": "905000200711010203ff",
+        "81090439ff": "905003ff",
+        "81090438ff": "905002ff",
+        "81090447ff": "905001020304ff",
+        "8109044bff": "90500000010aff",
+        "8109042472ff": "90500101ff",
+    })
+    snap = snapshot(cam)
+    assert snap.brand == "sony_ev95xx"
+    assert snap.zoom == 0x1234 and snap.iris == 0x1a and snap.monitoring_mode == 0x11
+    assert snap.ae_mode == 3 and snap.focus_mode == 2
+    cmds = [c.hex() for c in restore_commands(CameraSnapshot.from_dict(snap.to_dict()), include_mode=True)]
+    assert "810104470102030 4ff".replace(" ", "") in cmds
+    assert "8101044b0000010aff" in cmds
+    assert "81010424720101ff" in cmds
+    assert not any(c.startswith("81010448") for c in cmds)       # auto focus: no focus position
+    snap.monitoring_mode = snap.lvds_mode = None
+    restore(cam, snap, include_mode=True)
+    assert bytes.fromhex("8101041903ff") not in cam.sent       # no mode setter ran: no camera reset
+    snap.monitoring_mode = 0x11
+    restore(cam, snap, include_mode=True)
+    assert cam.sent[-1] == bytes.fromhex("8101041903ff")
@@ -0,0 +1,28 @@
+from time import sleep
+from .watchdog import *
+
+def test_watchdog_recovers(bridge):
+    bridge.regs[0x2] = 0xFE
+    replays = []
+    def replay(dev):
+        replays.append(dev)
+        bridge.timing = lambda: (1920, 1080, 16667)
+    bridge.timing = lambda: (0, 0, 0)
+    with LinkWatchdog("/dev/null", "1080p60", replay, periods=2, power_off_s=0, boot_s=0) as wd:
+        wd.sampler.run(wd.check, count=2)
+        assert replays == ["/dev/null"] and bridge.regs[0x2] == 0xFE
+        assert [w[1] for w in bridge.writes] == [0xF6, 0xFE]
+        assert wd.stats()["outages"] == 1 and wd.stats()["mttr_s"] < 1
+
+def test_watchdog_glitch_is_no_outage(bridge):
+    def replay(dev):
+        bridge.timing = lambda: (1920, 1080, 16667)
+    with LinkWatchdog("/dev/null", "1080p60", replay, periods=2, power_off_s=0, boot_s=0) as wd:
+        bridge.timing = lambda: (0, 0, 0)
+        wd.sampler.run(wd.check, count=1)       # one bad frame
+        bridge.timing = lambda: (1920, 1080, 16667)
+        wd.sampler.run(wd.check, count=1)
+        sleep(0.3)
+        bridge.timing = lambda: (0, 0, 0)       # the real outage
+        wd.sampler.run(wd.check, count=2)
+        assert wd.stats()["outages"] == 1 and wd.stats()["mttr_s"] < 0.2
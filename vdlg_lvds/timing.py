@@ -0,0 +1,67 @@
+#! /usr/bin/env python3
+# SPDX-License-Identifier: GPL-2.0
+#
+# Adaptive per-command response timing, learned from observed reply latencies.
+#
+
+import os
+from vdlg_lvds.store import cache_path, load_json, save_json
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    idx = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[idx]
+
+class AdaptiveTiming():
+    """
+    Records first-byte latency and the largest inter-byte gap of replies per (device, command prefix)
+    and derives transceive start/stop waits from a percentile of them plus a safety margin.
+    Until `min_samples` replies are seen for a command, the caller's defaults apply. Given the baud
+    rate, the waits are floored at the byte times of the command and of `gap_bytes` reply bytes, so
+    gaps measured on a fast poll never shrink them below what the wire allows.
+    """
+    def __init__(self, path=None, prefix_len=4, pct=95, margin=1.5, pad_ms=5, min_samples=5, history=64,
+                 gap_bytes=4):
+        self.path = path or cache_path("timing.json")
+        self.prefix_len = prefix_len
+        self.pct = pct
+        self.margin = margin
+        self.pad_ms = pad_ms
+        self.min_samples = min_samples
+        self.history = history
+        self.gap_bytes = gap_bytes      # stop wait never below this many byte times on the wire
+        self.profiles = load_json(self.path, {})
+        self.dirty = False
+
+    def key(self, dev, data):
+        return f"{os.path.realpath(dev)}|{bytes(data[:self.prefix_len]).hex()}"
+
+    def record(self, dev, data, first_ms, last_ms, gap_ms):
+        prof = self.profiles.setdefault(self.key(dev, data), {"first": [], "last": [], "gap": []})
+        for name, val in (("first", first_ms), ("last", last_ms), ("gap", gap_ms)):
+            prof[name].append(round(val, 2))
+            del prof[name][:-self.history]
+        self.dirty = True
+
+    def miss(self, dev, data):
+        # no reply with learned waits: they may be too tight, go back to defaults and relearn
+        if self.profiles.pop(self.key(dev, data), None) is not None:
+            self.dirty = True
+
+    def waits(self, dev, data, baud=None):
+        """ (start_wait_ms, stop_wait_ms) for this command at `baud`, or None while still learning. """
+        prof = self.profiles.get(self.key(dev, data))
+        if prof is None or len(prof["first"]) < self.min_samples:
+            return None
+        start = percentile(prof["first"], self.pct) * self.margin + self.pad_ms
+        stop = percentile(prof["gap"], self.pct) * self.margin + self.pad_ms
+        if baud:
+            byte_ms = 10 * 1000 / baud      # 8N1
+            start = max(start, (len(data) + self.gap_bytes) * byte_ms + self.pad_ms)
+            stop = max(stop, self.gap_bytes * byte_ms + self.pad_ms)
+        return start, stop
+
+    def save(self):
+        if self.dirty:
+            save_json(self.path, self.profiles)
+            self.dirty = False
@@ -0,0 +1,356 @@
+#! /usr/bin/env python3
+# SPDX-License-Identifier: GPL-2.0
+#
+# VISCA reply parsing and transceive frame detection.
+#
+
+import random
+from collections import namedtuple, deque
+from contextlib import nullcontext
+from time import monotonic, sleep
+
+TERMINATOR = 0xFF
+
+# reply kinds, from the upper nibble of the second byte: y0 4z FF / y0 5z .. FF / y0 6z ee FF
+ACK        = "ack"
+COMPLETION = "completion"
+ERROR      = "error"
+OTHER      = "other"
+
+ERR_LENGTH          = 0x01
+ERR_SYNTAX          = 0x02
+ERR_BUFFER_FULL     = 0x03
+ERR_CANCELED        = 0x04
+ERR_NO_SOCKET       = 0x05
+ERR_NOT_EXECUTABLE  = 0x41
+
+ERRORS = {
+    ERR_LENGTH:         "message length error",
+    ERR_SYNTAX:         "syntax error",
+    ERR_BUFFER_FULL:    "command buffer full",
+    ERR_CANCELED:       "command canceled",
+    ERR_NO_SOCKET:      "no socket",
+    ERR_NOT_EXECUTABLE: "command not executable",
+}
+
+# kind: ACK/COMPLETION/ERROR/OTHER, socket: z nibble, payload: bytes between header and FF (error code for ERROR)
+ViscaReply = namedtuple("ViscaReply", "kind socket payload")
+
+def split_frames(buf):
+    """ Split raw RX bytes into complete FF-terminated frames. Returns (frames, leftover). """
+    frames = []
+    start = 0
+    end = buf.find(TERMINATOR)
+    while end >= 0:
+        frames.append(bytes(buf[start:end + 1]))
+        start = end + 1
+        end = buf.find(TERMINATOR, start)
+    return frames, bytes(buf[start:])
+
+def parse_reply(frame):
+    if len(frame) < 3:
+        return ViscaReply(OTHER, 0, bytes(frame[1:-1]))
+    kind = {0x40: ACK, 0x50: COMPLETION, 0x60: ERROR}.get(frame[1] & 0xF0, OTHER)
+    return ViscaReply(kind, frame[1] & 0x0F, bytes(frame[2:-1]))
+
+def parse_replies(buf):
+    return [parse_reply(f) for f in split_frames(buf)[0]]
+
+def error_code(reply):
+    return reply.payload[0] if reply.kind == ERROR and reply.payload else None
+
+class ViscaFrame():
+    """
+    transceive() frame detector. Complete as soon as the reply we wait for is in:
+    until=ACK returns on the ACK (or a direct completion, e.g. inquiry answers),
+    until=COMPLETION waits for the completion / inquiry answer. Errors always complete.
+    """
+    def __init__(self, until=COMPLETION):
+        self.until = until
+
+    def __call__(self, buf):
+        if not buf or buf[-1] != TERMINATOR:
+            return False
+        for reply in parse_replies(buf):
+            if reply.kind == ERROR or reply.kind == COMPLETION:
+                return True
+            if reply.kind == ACK and self.until == ACK:
+                return True
+        return False
+
+# (category, command) byte pairs of continuous / positional control commands -> axis they drive
+AXES = {
+    (0x04, 0x07): "zoom",     (0x04, 0x47): "zoom",
+    (0x04, 0x08): "focus",    (0x04, 0x48): "focus",
+    (0x04, 0x0B): "iris",     (0x04, 0x4B): "iris",
+    (0x04, 0x0A): "shutter",  (0x04, 0x4A): "shutter",
+    (0x04, 0x0C): "gain",     (0x04, 0x4C): "gain",
+    (0x06, 0x01): "pan_tilt", (0x06, 0x02): "pan_tilt", (0x06, 0x03): "pan_tilt",
+    (0x06, 0x04): "pan_tilt", (0x06, 0x05): "pan_tilt",
+}
+
+def command_axis(cmd):
+    """ Axis ('zoom', 'focus', 'pan_tilt', ...) a 8x 01 cc nn .. FF command drives, None if it is not an axis command. """
+    if len(cmd) < 5 or cmd[1] != 0x01:
+        return None
+    return AXES.get((cmd[2], cmd[3]))
+
+INQUIRY = 0x09
+
+# Camera parameters that can be both set and inquired:
+#   name: (setter bytes after 8x, inquiry bytes after 8x, value length)
+#   set:      8x <setter> <value> FF
+#   inquire:  8x <inquiry> FF  ->  y0 50 <value> FF
+PARAMS = {
+    "zoom":            (b"\x01\x04\x47",     b"\x09\x04\x47",     4),
+    "focus":           (b"\x01\x04\x48",     b"\x09\x04\x48",     4),
+    "iris":            (b"\x01\x04\x4B",     b"\x09\x04\x4B",     4),
+    "shutter":         (b"\x01\x04\x4A",     b"\x09\x04\x4A",     4),
+    "gain":            (b"\x01\x04\x4C",     b"\x09\x04\x4C",     4),
+    "ae_mode":         (b"\x01\x04\x39",     b"\x09\x04\x39",     1),
+    "wb_mode":         (b"\x01\x04\x35",     b"\x09\x04\x35",     1),
+    "focus_mode":      (b"\x01\x04\x38",     b"\x09\x04\x38",     1),
+    "monitoring_mode": (b"\x01\x04\x24\x72", b"\x09\x04\x24\x72", 2),
+    "lvds_mode":       (b"\x01\x04\x24\x74", b"\x09\x04\x24\x74", 2),
+    "version":         (None,                b"\x09\x00\x02",     7),
+}
+
+# setter values that do not set the inquired value (focus_mode 10 = auto/manual toggle)
+TOGGLES = {"focus_mode": (b"\x10",)}
+
+# what a command changes besides its own parameter
+SIDE_EFFECTS = {
+    "ae_mode": ("iris", "shutter", "gain"),
+}
+
+def reply_header(cmd):
+    # 8x -> y0 with y = x + 8
+    return bytes([((cmd[0] & 0x07) + 8) << 4])
+
+def inquiry_param(cmd):
+    """ Name of the PARAMS entry `cmd` inquires, or None. """
+    for name, (_, inq, _) in PARAMS.items():
+        if cmd[1:-1] == inq:
+            return name
+    return None
+
+def decode_setter(cmd):
+    """ (name, value) of a PARAMS setter command, None if `cmd` is not one. """
+    for name, (setter, _, size) in PARAMS.items():
+        if setter and cmd[1:1 + len(setter)] == setter:
+            value = bytes(cmd[1 + len(setter):-1])
+            if len(value) == size and value not in TOGGLES.get(name, ()):
+                return name, value
+            return name, None
+    return None
+
+def setter_command(name, value, address=1):
+    return bytes([0x80 | address]) + PARAMS[name][0] + bytes(value) + b"\xff"
+
+def inquiry_command(name, address=1):
+    return bytes([0x80 | address]) + PARAMS[name][1] + b"\xff"
+
+class ViscaError(RuntimeError):
+    def __init__(self, cmd, code):
+        self.cmd = bytes(cmd)
+        self.code = code
+        super().__init__(f"{self.cmd.hex()}: {ERRORS.get(code, 'timeout' if code is None else hex(code))}")
+
+class ViscaResult():
+    __slots__ = ("cmd", "reply", "error", "socket", "ms")
+    def __init__(self, cmd):
+        self.cmd = bytes(cmd)
+        self.reply = bytearray()    # every frame received for this command, ACK included
+        self.error = None           # VISCA error code, None on success
+        self.socket = None
+        self.ms = None              # send -> completion
+
+    @property
+    def ok(self):
+        return self.error is None and self.ms is not None
+
+    def raise_for_error(self):
+        if not self.ok:
+            raise ViscaError(self.cmd, self.error)
+        return self
+
+# errors that mean "too fast", not "wrong command": worth a retry after backing off
+THROTTLE_ERRORS = (ERR_BUFFER_FULL, ERR_NOT_EXECUTABLE)
+
+class ViscaRateController():
+    """
+    Per camera command pacing. A buffer-full / not-executable reply doubles the spacing between
+    commands and adds a jittered exponential back-off; every success shrinks the spacing again by
+    `recover` (multiplicative) down to `min_interval_ms`. rate() reports the sustained command rate.
+    """
+    def __init__(self, min_interval_ms=0, max_interval_ms=500, backoff_ms=10, recover=0.9, max_backoff_ms=2000):
+        self.min_interval = min_interval_ms / 1000
+        self.max_interval = max_interval_ms / 1000
+        self.backoff = backoff_ms / 1000
+        self.max_backoff = max_backoff_ms / 1000
+        self.recover = recover
+        self.interval = self.min_interval
+        self.failures = 0
+        self.next_send = 0.0
+        self.ok = 0
+        self.rejected = 0
+        self.t_first = None
+        self.t_last = None
+
+    def ready(self, now=None):
+        return (monotonic() if now is None else now) >= self.next_send
+
+    def on_send(self, now=None):
+        now = monotonic() if now is None else now
+        if self.t_first is None:
+            self.t_first = now
+        self.next_send = now + self.interval
+
+    def on_success(self, now=None):
+        self.ok += 1
+        self.failures = 0
+        self.t_last = monotonic() if now is None else now
+        self.interval = max(self.min_interval, self.interval * self.recover)
+
+    def on_reject(self, now=None):
+        now = monotonic() if now is None else now
+        self.rejected += 1
+        self.failures += 1
+        self.interval = min(self.max_interval, max(self.interval * 2, self.backoff))
+        delay = min(self.max_backoff, self.backoff * 2 ** (self.failures - 1)) * random.uniform(0.5, 1.5)
+        self.next_send = max(self.next_send, now + delay)
+
+    def rate(self):
+        """ Completed commands per second since the first send. """
+        if not self.ok or self.t_last is None or self.t_last <= self.t_first:
+            return 0.0
+        return self.ok / (self.t_last - self.t_first)
+
+    def stats(self):
+        return {"ok": self.ok, "rejected": self.rejected, "interval_ms": round(self.interval * 1000, 2), "rate": round(self.rate(), 2)}
+
+class ViscaEngine():
+    """
+    VISCA transaction engine keeping both command sockets of the camera busy.
+    A command is sent as soon as the previous one is ACKed and a socket is free; ACK (y0 4z FF),
+    completion (y0 5z FF) and error (y0 6z ee FF) replies are matched by socket number. Inquiries
+    (8x 09 ..) take no socket and are answered in order; up to `inquiry_depth` of them are kept in flight.
+    With a ViscaRateController, sends are paced by it and commands rejected with buffer-full /
+    not-executable are re-sent (up to `retries` times) after its back-off.
+    When the oldest direct reply times out, a late reply could no longer be told from the next one:
+    the timed out command fails, the inquiries behind it are re-queued and nothing is sent until the
+    link stayed quiet for the ACK timeout, discarding the stray replies.
+    """
+    def __init__(self, serial, sockets=2, ack_timeout_ms=200, completion_timeout_ms=5000, poll_s=0.002, rate=None, retries=3, inquiry_depth=1):
+        self.serial = serial
+        self.inquiry_depth = inquiry_depth
+        self.rate = rate
+        self.retries = retries
+        self.sockets = sockets
+        self.ack_timeout = ack_timeout_ms / 1000
+        self.completion_timeout = completion_timeout_ms / 1000
+        self.poll_s = poll_s
+        self._buf = bytearray()
+
+    def _replies(self):
+        cnt = self.serial.get_rx_count()
+        if not cnt:
+            return []
+        self._buf += self.serial.recv(cnt)
+        frames, rest = split_frames(self._buf)
+        self._buf = bytearray(rest)
+        return [(f, parse_reply(f)) for f in frames]
+
+    def run(self, commands, until=COMPLETION):
+        """ Execute `commands` in order, pipelined. Returns one ViscaResult per command. until=ACK stops waiting at the ACK. """
+        results = [ViscaResult(c) for c in commands]
+        sent = {}                   # index -> send time
+        executing = {}              # socket -> index
+        direct = deque()            # indices waiting for a direct reply: the ACK of a command, or inquiry answers
+        pending = deque(range(len(results)))
+        attempts = [0] * len(results)
+        drain_until = None          # resync after a timeout: no sends, unmatched replies dropped until then
+        rate = self.rate
+        with getattr(self.serial, "lock", None) or nullcontext():
+            self.serial.recv()
+            self._buf.clear()
+            while pending or direct or executing:
+                busy = True
+                if pending and drain_until is None and (rate is None or rate.ready()):
+                    # replies carry no command id: never mix a command awaiting its ACK with inquiries in flight
+                    if results[pending[0]].cmd[1] == INQUIRY:
+                        can_send = len(direct) < self.inquiry_depth and all(results[i].cmd[1] == INQUIRY for i in direct)
+                    else:
+                        can_send = not direct and len(executing) < self.sockets
+                    if can_send:
+                        idx = pending.popleft()
+                        self.serial.send(results[idx].cmd)
+                        sent[idx] = monotonic()
+                        attempts[idx] += 1
+                        direct.append(idx)
+                        if rate is not None:
+                            rate.on_send(sent[idx])
+                        busy = False
+                for frame, reply in self._replies():
+                    busy = False
+                    now = monotonic()
+                    if drain_until is not None and not (reply.kind != ACK and reply.socket in executing):
+                        drain_until = now + self.ack_timeout
+                        continue
+                    if reply.kind == ACK and direct:
+                        idx = direct.popleft()
+                        res = results[idx]
+                        res.reply += frame
+                        res.socket = reply.socket
+                        if until == ACK:
+                            res.ms = (now - sent[idx]) * 1000
+                            if rate is not None:
+                                rate.on_success(now)
+                        else:
+                            executing[reply.socket] = idx
+                    elif reply.kind == COMPLETION and reply.socket in executing:
+                        idx = executing.pop(reply.socket)
+                        results[idx].reply += frame
+                        results[idx].ms = (now - sent[idx]) * 1000
+                        if rate is not None:
+                            rate.on_success(now)
+                    elif reply.kind == COMPLETION and direct:
+                        # inquiry answer, or a command the camera completed without an ACK
+                        idx = direct.popleft()
+                        results[idx].reply += frame
+                        results[idx].ms = (now - sent[idx]) * 1000
+                        if rate is not None:
+                            rate.on_success(now)
+                    elif reply.kind == ERROR:
+                        # failed while executing in its socket, or rejected before the ACK (syntax, buffer full, ...)
+                        if reply.socket in executing:
+                            idx = executing.pop(reply.socket)
+                        elif direct:
+                            idx = direct.popleft()
+                        else:
+                            continue
+                        code = error_code(reply)
+                        if rate is not None and code in THROTTLE_ERRORS:
+                            rate.on_reject(now)
+                            if attempts[idx] <= self.retries:
+                                pending.appendleft(idx)
+                                continue
+                        results[idx].reply += frame
+                        results[idx].error = code
+                now = monotonic()
+                if direct and now - sent[direct[0]] > self.ack_timeout:
+                    direct.popleft()
+                    pending.extendleft(reversed(direct))
+                    direct.clear()
+                    drain_until = now + self.ack_timeout
+                elif drain_until is not None and now > drain_until:
+                    drain_until = None
+                for sock, idx in list(executing.items()):
+                    if now - sent[idx] > self.completion_timeout:
+                        del executing[sock]
+                if busy:
+                    sleep(self.poll_s)
+        return results
+
+    def execute(self, command, until=COMPLETION):
+        return self.run([command], until)[0]
@@ -0,0 +1,153 @@
+#! /usr/bin/env python3
+# SPDX-License-Identifier: GPL-2.0
+#
+# LVDS link watchdog: samples status and timing counters about once per frame, declares the link
+# lost after a few bad frame periods, power-cycles the camera through the ENABLE register, replays
+# the last known serial configuration and measures the time to recovery.
+#
+
+import argparse
+import glob
+import json
+import statistics
+from time import monotonic, sleep
+from vdlg_lvds.get_res import parse_resolution, timing_matches, wait_for_lock
+from vdlg_lvds.regmap import REGISTERS
+from vdlg_lvds.telemetry import TelemetrySampler, is_dropout
+
+ENABLE_CAM_POWER = 0x08     # CROSSLINK_REG_ENABLE b3, cleared by the driver's own powerdown (0x07)
+
+class LinkWatchdog():
+    """
+    Watch one bridge. `resolution` (e.g. '1080p60') makes a wrong geometry/rate count as a fault too.
+    `replay(dev)` re-sends the camera configuration once it is powered again.
+    """
+    def __init__(self, dev, resolution=None, replay=None, periods=3, frame_s=None, power_off_s=0.5,
+                 boot_s=2.0, lock_timeout=10.0):
+        self.dev = dev
+        self.resolution = resolution
+        self.replay = replay
+        self.periods = periods
+        self.power_off_s = power_off_s
+        self.boot_s = boot_s
+        self.lock_timeout = lock_timeout
+        if frame_s is None:
+            frame_s = 1 / parse_resolution(resolution)[2] if resolution else 1 / 25
+        self.sampler = TelemetrySampler([dev], rate_hz=1 / frame_s, size=64)
+        self.regs = self.sampler.devices[dev]
+        self.bad = 0
+        self.lost_at = None
+        self.outages = []       # seconds from loss of lock to recovered video
+        self.failures = 0
+
+    def close(self):
+        self.sampler.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def healthy(self, sample):
+        if sample is None or is_dropout(sample):
+            return False
+        return self.resolution is None or timing_matches((sample.cols, sample.lines, sample.period_us), self.resolution)
+
+    def check(self, taken):
+        # sampler callback, once per frame period
+        if self.healthy(taken.get(self.dev)):
+            self.bad = 0
+            self.lost_at = None     # a glitch that healed on its own is no outage
+            return
+        self.bad += 1
+        if self.lost_at is None:
+            self.lost_at = monotonic()
+        if self.bad >= self.periods:
+            self.recover()
+
+    def power_cycle(self):
+        self.regs.read(REGISTERS["enable"].address, 1)      # the driver rewrites it on stream on/off
+        enable = self.regs["enable"]
+        self.regs.apply({"enable": enable & ~ENABLE_CAM_POWER})
+        sleep(self.power_off_s)
+        self.regs.apply({"enable": enable | ENABLE_CAM_POWER})
+
+    def recover(self):
+        """ Power-cycle, replay and wait for the video to lock again. Returns the outage in s, None if still down. """
+        print(f"{self.dev}: link lost, power cycling camera")
+        try:
+            self.power_cycle()
+            sleep(self.boot_s)
+            if self.replay:
+                self.replay(self.dev)
+        except (OSError, RuntimeError, ValueError) as e:
+            print(f"{self.dev}: recovery step failed: {e}")
+        if self.resolution:
+            locked = wait_for_lock(self.regs.dev, self.resolution, timeout=self.lock_timeout) is not None
+        else:
+            locked = self.wait_healthy()
+        self.bad = 0
+        if not locked:
+            self.failures += 1
+            print(f"{self.dev}: no video after recovery, retrying")
+            return None
+        outage = monotonic() - self.lost_at
+        self.lost_at = None
+        self.outages.append(outage)
+        print(f"{self.dev}: recovered after {outage:.1f} s, {self.stats()}")
+        return outage
+
+    def wait_healthy(self):
+        end = monotonic() + self.lock_timeout
+        while monotonic() < end:
+            if self.healthy(self.sampler.poll().get(self.dev)):
+                return True
+            sleep(1 / self.sampler.rate_hz)
+        return False
+
+    def stats(self):
+        return {"outages": len(self.outages), "failures": self.failures,
+                "mttr_s": statistics.mean(self.outages) if self.outages else None}
+
+    def run(self, stop=None):
+        self.sampler.run(self.check, stop=stop)
+
+def replay_camera(resolution=None, snapshot_file=None, socket_path=None):
+    """ replay(dev) for LinkWatchdog: the video mode through set_res, then the saved camera state. """
+    def replay(dev):
+        from vdlg_lvds.daemon import connect_serial
+        from vdlg_lvds.set_res import detect_camera_brand, set_resolution
+        from vdlg_lvds.snapshot import CameraSnapshot, restore
+        serial = connect_serial(dev, socket_path)
+        try:
+            if resolution:
+                set_resolution(serial, resolution, detect_camera_brand(serial), dev=None)
+            if snapshot_file:
+                with open(snapshot_file) as f:
+                    restore(serial, CameraSnapshot.from_dict(json.load(f)))
+        finally:
+            serial.close()
+    return replay
+
+def main():
+    lvds_devs = glob.glob("/dev/links/lvds*")
+    default_lvds = lvds_devs[0] if lvds_devs else "/dev/v4l-subdev1"
+    parser = argparse.ArgumentParser(description="Watch the LVDS link and recover a lost camera automatically")
+    parser.add_argument("-d", "--dev", type=str, default=default_lvds, help="Device path")
+    parser.add_argument("-r", "--resolution", type=str, default=None, help="Expected mode, e.g. '1080p60'; re-applied on recovery")
+    parser.add_argument("-S", "--snapshot", type=str, default=None, help="Camera snapshot JSON re-applied on recovery")
+    parser.add_argument("-s", "--socket", type=str, default=None, help="Send camera commands through the vdlg-lvds-daemon socket")
+    parser.add_argument("-p", "--periods", type=int, default=3, help="Bad frame periods before the link counts as lost")
+    args = parser.parse_args()
+
+    replay = replay_camera(args.resolution, args.snapshot, args.socket) if args.resolution or args.snapshot else None
+    with LinkWatchdog(args.dev, args.resolution, replay, periods=args.periods) as wd:
+        try:
+            wd.run()
+        except KeyboardInterrupt:
+            pass
+        print(json.dumps(wd.stats()))
+
+if __name__ == "__main__":
+    main()